@@ -1,43 +1,215 @@
 import cv2
+import numpy as np
 
-def detect_traffic_light_state(roi):
+from stopLine import StopLine
+
+CAR_CLASS = 2
+TRAFFIC_LIGHT_CLASS = 9
+
+
+def split_detections(result, scale=1.0):
+    """
+    Разделяет результат YOLO на рамки машин и рамки светофоров.
+
+    Args:
+        result: Результат модели для одного изображения (results[0])
+        scale: Масштаб кадра, поданного в модель, относительно исходного
+               (рамки переводятся обратно в координаты исходного кадра)
+
+    Returns:
+        tuple: (car_boxes, traffic_light_boxes), каждый — список [(x1, y1, x2, y2), ...]
+    """
+    car_boxes = []
+    traffic_light_boxes = []
+
+    for box in result.boxes:
+        cls = int(box.cls[0])
+        x1, y1, x2, y2 = (int(v / scale) for v in box.xyxy[0])
+        if cls == CAR_CLASS:
+            car_boxes.append((x1, y1, x2, y2))
+        elif cls == TRAFFIC_LIGHT_CLASS:
+            traffic_light_boxes.append((x1, y1, x2, y2))
+
+    return car_boxes, traffic_light_boxes
+
+
+def shift_boxes(boxes, dx, dy):
+    """Переводит рамки из координат вырезанной области в координаты кадра."""
+    return [(x1 + dx, y1 + dy, x2 + dx, y2 + dy) for x1, y1, x2, y2 in boxes]
+
+
+def detect_cars_and_traffic_lights(model, img, scale=1.0):
+    """
+    Находит машины и светофоры за один проход модели.
+
+    Args:
+        model: Загруженная модель YOLO
+        img: Изображение (numpy array), например результат Preprocessor
+        scale: Масштаб img относительно исходного кадра (второе значение Preprocessor)
+
+    Returns:
+        tuple: (car_boxes, traffic_light_boxes) в координатах исходного кадра, см. split_detections
+    """
+    results = model(img, classes=[CAR_CLASS, TRAFFIC_LIGHT_CLASS], verbose=False)
+    return split_detections(results[0], scale)
+
+
+def box_iou(boxes1, boxes2):
+    """
+    Матрица IoU между двумя наборами рамок.
+
+    Args:
+        boxes1: Рамки формы (N, 4) в формате x1, y1, x2, y2
+        boxes2: Рамки формы (M, 4)
+
+    Returns:
+        numpy.ndarray: Матрица формы (N, M)
+    """
+    a = np.asarray(boxes1, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes2, dtype=np.float64).reshape(-1, 4)
+
+    inter_w = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    inter_h = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+# С какого числа машин проверка стоп-линии переходит на NumPy (см. check_car_over_stop_line)
+VECTORIZE_MIN_BOXES = 48
+
+RED_RANGES = [((0, 70, 50), (10, 255, 255)), ((170, 70, 50), (180, 255, 255))]
+YELLOW_RANGE = ((15, 70, 50), (35, 255, 255))
+GREEN_RANGE = ((36, 70, 50), (85, 255, 255))
+DOMINANT_RATIO = 0.1  # Доля пикселей цвета в зоне, при которой сигнал считается включенным
+
+
+def classify_traffic_light(roi):
+    """
+    Определяет состояние светофора за одно преобразование ROI в HSV.
+    Маски красного, желтого и зеленого строятся по зонам одного HSV-буфера.
+
+    Args:
+        roi: Область светофора в BGR
+
+    Returns:
+        tuple: (state, ratios), где state — "red", "yellow", "green" или "unknown",
+            ratios — доля пикселей своего цвета в каждой зоне {'red': float, 'yellow': float, 'green': float}
+    """
+    ratios = {'red': 0.0, 'yellow': 0.0, 'green': 0.0}
     if roi.size == 0:
-        return "unknown"
+        return "unknown", ratios
 
     h, w = roi.shape[:2]
     if h < 30 or w < 10:
-        return "unknown"
+        return "unknown", ratios
+
+    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
 
     third = h // 3
-    red_zone    = roi[0:third, :]
-    yellow_zone = roi[third:2*third, :]
-    green_zone  = roi[2*third:, :]
-
-    def is_color_dominant(zone, lower, upper):
-        hsv = cv2.cvtColor(zone, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, lower, upper)
-        return cv2.countNonZero(mask) > (zone.shape[0] * zone.shape[1] * 0.1)
-
-    red_lower1, red_upper1 = (0, 70, 50), (10, 255, 255)
-    red_lower2, red_upper2 = (170, 70, 50), (180, 255, 255)
-    yellow_lower, yellow_upper = (15, 70, 50), (35, 255, 255)
-    green_lower, green_upper = (36, 70, 50), (85, 255, 255)
-
-    red_mask1 = cv2.inRange(cv2.cvtColor(red_zone, cv2.COLOR_BGR2HSV), red_lower1, red_upper1)
-    red_mask2 = cv2.inRange(cv2.cvtColor(red_zone, cv2.COLOR_BGR2HSV), red_lower2, red_upper2)
-    red_active = (cv2.countNonZero(red_mask1) + cv2.countNonZero(red_mask2)) > (red_zone.shape[0] * red_zone.shape[1] * 0.1)
-
-    yellow_active = is_color_dominant(yellow_zone, yellow_lower, yellow_upper)
-    green_active = is_color_dominant(green_zone, green_lower, green_upper)
-
-    if red_active:
-        return "red"
-    elif yellow_active:
-        return "yellow"
-    elif green_active:
-        return "green"
+    red_zone    = hsv[0:third, :]
+    yellow_zone = hsv[third:2*third, :]
+    green_zone  = hsv[2*third:, :]
+
+    red_count = sum(cv2.countNonZero(cv2.inRange(red_zone, lower, upper)) for lower, upper in RED_RANGES)
+    yellow_count = cv2.countNonZero(cv2.inRange(yellow_zone, *YELLOW_RANGE))
+    green_count = cv2.countNonZero(cv2.inRange(green_zone, *GREEN_RANGE))
+
+    red_area = red_zone.shape[0] * red_zone.shape[1]
+    yellow_area = yellow_zone.shape[0] * yellow_zone.shape[1]
+    green_area = green_zone.shape[0] * green_zone.shape[1]
+
+    ratios = {
+        'red': red_count / red_area,
+        'yellow': yellow_count / yellow_area,
+        'green': green_count / green_area
+    }
+
+    if red_count > red_area * DOMINANT_RATIO:
+        return "red", ratios
+    elif yellow_count > yellow_area * DOMINANT_RATIO:
+        return "yellow", ratios
+    elif green_count > green_area * DOMINANT_RATIO:
+        return "green", ratios
     else:
-        return "unknown"
+        return "unknown", ratios
+
+
+def detect_traffic_light_state(roi):
+    return classify_traffic_light(roi)[0]
+
+
+def classify_traffic_lights(frame, boxes):
+    """
+    Определяет состояние всех светофоров кадра за одно преобразование в HSV.
+    Общий прямоугольник всех рамок переводится в HSV один раз, а число пикселей
+    цвета в каждой зоне считается по интегральным изображениям масок.
+    Результат совпадает с detect_traffic_light_state(frame[y1:y2, x1:x2]) для каждой рамки.
+
+    Args:
+        frame: Кадр в BGR
+        boxes: Рамки светофоров формы (N, 4) в формате x1, y1, x2, y2
+
+    Returns:
+        list: N состояний — "red", "yellow", "green" или "unknown"
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    states = ["unknown"] * len(boxes)
+
+    # Рамки обрезаются по границам кадра, как при срезе frame[y1:y2, x1:x2]
+    frame_h, frame_w = frame.shape[:2]
+    x1 = np.clip(boxes[:, 0], 0, frame_w)
+    y1 = np.clip(boxes[:, 1], 0, frame_h)
+    x2 = np.clip(boxes[:, 2], x1, frame_w)
+    y2 = np.clip(boxes[:, 3], y1, frame_h)
+    h = y2 - y1
+    w = x2 - x1
+
+    valid = (h >= 30) & (w >= 10)
+    if not valid.any():
+        return states
+
+    x1, y1, x2, y2, h, w = x1[valid], y1[valid], x2[valid], y2[valid], h[valid], w[valid]
+    ux1, uy1 = x1.min(), y1.min()
+    hsv = cv2.cvtColor(frame[uy1:y2.max(), ux1:x2.max()], cv2.COLOR_BGR2HSV)
+
+    # Маски 0/1 и их интегральные изображения
+    red_mask = sum(cv2.inRange(hsv, lower, upper) // 255 for lower, upper in RED_RANGES)
+    integrals = {
+        'red': cv2.integral(red_mask),
+        'yellow': cv2.integral(cv2.inRange(hsv, *YELLOW_RANGE) // 255),
+        'green': cv2.integral(cv2.inRange(hsv, *GREEN_RANGE) // 255)
+    }
+
+    # Переводим рамки в координаты общего прямоугольника
+    x1, x2 = x1 - ux1, x2 - ux1
+    y1, y2 = y1 - uy1, y2 - uy1
+    third = h // 3
+    zones = {
+        'red': (y1, y1 + third),
+        'yellow': (y1 + third, y1 + 2 * third),
+        'green': (y1 + 2 * third, y2)
+    }
+
+    active = {}
+    for color, (top, bottom) in zones.items():
+        s = integrals[color]
+        count = s[bottom, x2] - s[top, x2] - s[bottom, x1] + s[top, x1]
+        active[color] = count > (bottom - top) * w * DOMINANT_RATIO
+
+    for i, index in enumerate(np.flatnonzero(valid)):
+        if active['red'][i]:
+            states[index] = "red"
+        elif active['yellow'][i]:
+            states[index] = "yellow"
+        elif active['green'][i]:
+            states[index] = "green"
+
+    return states
 
 
 def point_below_line(point, line_point1, line_point2):
@@ -199,68 +371,56 @@ def check_car_over_stop_line(car_boxes, stop_line_points, threshold=50):
         list: Список словарей с информацией о каждой машине:
             [{'box': (x1, y1, x2, y2), 'is_over': bool, 'distance': float}, ...]
     """
-    if stop_line_points is None or len(stop_line_points) != 2:
+    if isinstance(stop_line_points, StopLine):
+        stop_line = stop_line_points
+    elif stop_line_points is None or len(stop_line_points) != 2:
         return []
-    
-    line_point1, line_point2 = stop_line_points
+    else:
+        stop_line = StopLine.from_points(stop_line_points, threshold)
+
+    boxes = [tuple(box[:4]) for box in car_boxes if len(box) >= 4]
+    if not boxes:
+        return []
+
+    if len(boxes) < VECTORIZE_MIN_BOXES:
+        # На нескольких машинах чистый Python быстрее, чем подготовка массивов NumPy
+        evaluated = [stop_line.evaluate_box(box) for box in boxes]
+    else:
+        evaluated = zip(*stop_line.evaluate_boxes(boxes))
+
     results = []
-    
-    for box in car_boxes:
-        if len(box) < 4:
-            continue
-        
-        x1, y1, x2, y2 = box[:4]
-        
-        # Проверяем, пересекает ли стоп-линия bounding box машины
-        intersects = line_intersects_box(line_point1, line_point2, box)
-        
-        # Проверяем нижнюю часть машины (центр нижней границы)
-        car_bottom_center_x = (x1 + x2) // 2
-        car_bottom_center_y = y2
-        car_bottom_center = (car_bottom_center_x, car_bottom_center_y)
-        
-        # Проверяем, находится ли нижняя часть машины ниже линии
-        bottom_below = point_below_line(car_bottom_center, line_point1, line_point2)
-        
-        # Вычисляем расстояние от нижней части машины до линии
-        lx1, ly1 = line_point1
-        lx2, ly2 = line_point2
-        
-        px, py = car_bottom_center
-        
-        # Вычисляем расстояние от точки до прямой
-        if lx2 == lx1:
-            # Вертикальная линия
-            distance = abs(px - lx1)
-        else:
-            # Расстояние от точки до прямой: |Ax + By + C| / sqrt(A^2 + B^2)
-            A = ly2 - ly1
-            B = -(lx2 - lx1)
-            C = (lx2 - lx1) * ly1 - (ly2 - ly1) * lx1
-            distance = abs(A * px + B * py + C) / ((A**2 + B**2)**0.5)
-        
-        # Машина пересекает линию или находится сразу за ней, если:
-        # 1. Линия пересекает bounding box машины, ИЛИ
-        # 2. Нижняя часть машины находится ниже линии и расстояние не превышает threshold
-        is_over = False
-        if intersects:
-            # Линия пересекает машину
-            is_over = True
-            distance = -distance if bottom_below else distance
-        elif bottom_below and distance <= threshold:
-            # Машина находится сразу за линией (в пределах threshold)
-            is_over = True
-            distance = -distance
-        
+    for box, (box_is_over, box_distance) in zip(boxes, evaluated):
         results.append({
-            'box': (x1, y1, x2, y2),
-            'is_over': is_over,
-            'distance': distance
+            'box': box,
+            'is_over': bool(box_is_over),
+            'distance': float(box_distance)
         })
-    
+
     return results
 
 
+def check_cars_over_stop_line_array(car_boxes, stop_line_points, threshold=50):
+    """
+    Векторизованный вариант check_car_over_stop_line: все машины проверяются за один проход NumPy.
+    Результаты совпадают со скалярной версией.
+
+    Args:
+        car_boxes: Массив координат машин формы (N, 4) в формате x1, y1, x2, y2
+        stop_line_points: Список из двух точек [(x1, y1), (x2, y2)] для стоп-линии
+        threshold: Максимальное расстояние в пикселях для определения "сразу за линией" (по умолчанию 50)
+
+    Returns:
+        tuple: (is_over, distance) — массивы формы (N,); distance отрицательное для машин за линией
+    """
+    if isinstance(stop_line_points, StopLine):
+        return stop_line_points.evaluate_boxes(car_boxes)
+
+    if stop_line_points is None or len(stop_line_points) != 2:
+        return np.zeros(0, dtype=bool), np.zeros(0)
+
+    return StopLine.from_points(stop_line_points, threshold).evaluate_boxes(car_boxes)
+
+
 def detect_cars_over_stopline(car_boxes, stop_line_points):
     """
     Определяет машины, заехавшие за стоп-линию, заданную двумя точками.
@@ -275,4 +435,44 @@ def detect_cars_over_stopline(car_boxes, stop_line_points):
     # Проверяем каждую машину
     results = check_car_over_stop_line(car_boxes, stop_line_points)
     
-    return results
\ No newline at end of file
+    return results
+
+
+def analyze_frame(frame, car_boxes, traffic_light_boxes, stop_line_points, traffic_light_states=None):
+    """
+    Оценивает кадр: состояние светофоров и машины, заехавшие за стоп-линию.
+
+    Args:
+        frame: Исходное изображение в BGR (по нему определяется цвет светофора)
+        car_boxes: Список координат машин [(x1, y1, x2, y2), ...]
+        traffic_light_boxes: Список координат светофоров [(x1, y1, x2, y2), ...]
+        stop_line_points: Список из двух точек [(x1, y1), (x2, y2)] для стоп-линии
+        traffic_light_states: Уже известные состояния светофоров (например, из TrafficLightTracker);
+            если None, они определяются по кадру
+
+    Returns:
+        dict: {'traffic_light_state': str,
+               'traffic_lights': [{'box': (x1, y1, x2, y2), 'state': str}, ...],
+               'cars': [{'box', 'is_over', 'distance', 'violation'}, ...],
+               'violations': int}
+    """
+    states = traffic_light_states
+    if states is None:
+        states = classify_traffic_lights(frame, traffic_light_boxes)
+    traffic_lights = [{'box': tuple(box), 'state': state} for box, state in zip(traffic_light_boxes, states)]
+
+    # Как и в интерфейсе, решение принимается по первому найденному светофору
+    traffic_light_state = traffic_lights[0]['state'] if traffic_lights else "unknown"
+
+    cars = detect_cars_over_stopline(car_boxes, stop_line_points)
+    violations = 0
+    for car in cars:
+        car['violation'] = car['is_over'] and traffic_light_state == "red"
+        violations += car['violation']
+
+    return {
+        'traffic_light_state': traffic_light_state,
+        'traffic_lights': traffic_lights,
+        'cars': cars,
+        'violations': violations
+    }
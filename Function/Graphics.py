@@ -1,17 +1,41 @@
+import json
+import os
+
 import matplotlib.pyplot as plt
 import numpy as np
 
-models = ['yolo11n', 'yolo11s', 'yolo11m']
-latency_ms = [249, 338, 795]          # время в мс
-model_size_mb = [5.4, 18.4, 38.8]  # размер в МБ
-accuracy = [39.5, 47.0, 51.5]      # точность в %
+BENCHMARK_FILE = "benchmark.json"  # результаты benchmark.py
+# Точность (mAP COCO, %) из описания моделей — на наших кадрах разметки нет
+MODEL_ACCURACY = {'yolo11n': 39.5, 'yolo11s': 47.0, 'yolo11m': 51.5}
+
+
+def load_benchmark(path=BENCHMARK_FILE):
+    """
+    Берёт задержку (p50) и размер моделей из результатов benchmark.py.
+    Если файла нет, используются старые ручные замеры.
+    """
+    if not os.path.exists(path):
+        return ['yolo11n', 'yolo11s', 'yolo11m'], [249, 338, 795], [5.4, 18.4, 38.8], [39.5, 47.0, 51.5]
+
+    with open(path, encoding="utf-8") as f:
+        results = [r for r in json.load(f)['results'] if r['model'] in MODEL_ACCURACY]
+    several_backends = len({r['backend'] for r in results}) > 1
+
+    models = [f"{r['model']} {r['backend']}" if several_backends else r['model'] for r in results]
+    latency_ms = [r['latency_ms']['p50'] for r in results]
+    model_size_mb = [r['size_mb'] for r in results]
+    accuracy = [MODEL_ACCURACY[r['model']] for r in results]
+    return models, latency_ms, model_size_mb, accuracy
+
+
+models, latency_ms, model_size_mb, accuracy = load_benchmark()  # время в мс, размер в МБ, точность в %
 
 plt.style.use('dark_background')
 plt.figure(figsize=(10, 6))
 plt.plot(latency_ms, accuracy, 'o-', color='#b993d6', linewidth=2, markersize=8)
 for i, model in enumerate(models):
     plt.text(latency_ms[i] + 1, accuracy[i] + 0.3, model, fontsize=10)
-plt.xlabel('Среднее время обработки (мс)', fontsize=12)
+plt.xlabel('Медианное время обработки (мс)', fontsize=12)
 plt.ylabel('Точность (mAP, %)', fontsize=12)
 plt.title('Точность vs Скорость работы моделей', fontsize=14)
 plt.grid(True, linestyle='--', alpha=0.6)
@@ -0,0 +1,215 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+
+import cv2
+
+from cameraConfig import CameraConfig
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, analyze_frame, split_detections
+from metrics import METRICS
+from modelRegistry import BACKENDS, load_model
+from preprocessing import DEFAULT_DENOISE, DEFAULT_TARGET_SIZE, DENOISE_FILTERS, Preprocessor
+from processPool import InferencePool
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+CSV_FIELDS = ["image", "traffic_light_state", "cars", "cars_over", "violations", "violation_boxes"]
+
+
+def list_images(source):
+    """
+    Возвращает отсортированный список изображений из папки или по glob-шаблону.
+
+    Args:
+        source: Путь к папке с кадрами или шаблон вида "frames/*.jpg"
+
+    Returns:
+        list: Пути к изображениям
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def iter_batches(paths, batch_size):
+    """
+    Лениво читает изображения и отдаёт их пачками [(path, img_cv2), ...].
+    Нечитаемые файлы пропускаются.
+    """
+    batch = []
+    for path in paths:
+        img_cv2 = cv2.imread(path)
+        if img_cv2 is None:
+            print(f"Невозможно прочитать изображение: {path}")
+            continue
+
+        batch.append((path, img_cv2))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def run_batch(model, paths, stop_line_points, batch_size=16, kernel_size=3, preprocessor=None):
+    """
+    Прогоняет изображения через модель пачками и проверяет нарушения стоп-линии.
+
+    Args:
+        model: Загруженная модель YOLO
+        paths: Пути к изображениям
+        stop_line_points: Список из двух точек [(x1, y1), (x2, y2)] для стоп-линии
+            или CameraConfig с несколькими направлениями
+        batch_size: Количество кадров в одном вызове модели
+        kernel_size: Размер ядра фильтра шума
+        preprocessor: Настроенный Preprocessor (по умолчанию медианный фильтр в полном разрешении)
+
+    Yields:
+        dict: Результат analyze_frame с добавленным полем 'image'
+    """
+    preprocessor = preprocessor or Preprocessor(kernel_size)
+    for batch in iter_batches(paths, batch_size):
+        with METRICS.timer("preprocess"):
+            # Каждый кадр пачки пишется в свой слот переиспользуемых буферов
+            prepared = [preprocessor(img_cv2, slot=i) for i, (_, img_cv2) in enumerate(batch)]
+        with METRICS.timer("inference"):
+            results = model([img for img, _ in prepared], classes=[CAR_CLASS, TRAFFIC_LIGHT_CLASS], verbose=False)
+
+        for (path, img_cv2), (_, scale), result in zip(batch, prepared, results):
+            with METRICS.timer("postprocess"):
+                car_boxes, traffic_light_boxes = split_detections(result, scale)
+                if isinstance(stop_line_points, CameraConfig):
+                    record = stop_line_points.analyze(img_cv2, car_boxes, traffic_light_boxes)
+                else:
+                    record = analyze_frame(img_cv2, car_boxes, traffic_light_boxes, stop_line_points)
+            count_frame(record)
+            record['image'] = path
+            yield record
+
+
+def run_pool(pool, paths):
+    """
+    То же, что run_batch, но кадры обрабатываются процессами InferencePool:
+    каждый воркер сам выполняет предобработку, модель и analyze_frame
+    (стоп-линия задаётся при создании пула).
+    Результаты отдаются в порядке путей.
+    """
+    read_paths = []
+
+    def frames():
+        for batch in iter_batches(paths, 1):
+            path, img_cv2 = batch[0]
+            read_paths.append(path)
+            yield img_cv2
+
+    for path_index, record in enumerate(pool.map(frames())):
+        count_frame(record)
+        record['image'] = read_paths[path_index]
+        yield record
+
+
+def count_frame(analysis):
+    """Обновляет счётчики метрик по результату analyze_frame."""
+    METRICS.inc("frames")
+    METRICS.inc("cars_found", len(analysis['cars']))
+    METRICS.inc("traffic_lights_classified", len(analysis['traffic_lights']))
+    METRICS.inc("violations", analysis['violations'])
+
+
+def to_csv_row(record):
+    return {
+        'image': record['image'],
+        'traffic_light_state': record['traffic_light_state'],
+        'cars': len(record['cars']),
+        'cars_over': sum(1 for car in record['cars'] if car['is_over']),
+        'violations': record['violations'],
+        'violation_boxes': json.dumps([car['box'] for car in record['cars'] if car['violation']])
+    }
+
+
+def write_results(records, output_path, output_format):
+    """
+    Построчно записывает результаты в JSONL или CSV, не накапливая их в памяти.
+
+    Returns:
+        int: Количество обработанных изображений
+    """
+    count = 0
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        if output_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(to_csv_row(record))
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная проверка нарушений стоп-линии без интерфейса")
+    parser.add_argument("source", help="Папка с кадрами или glob-шаблон")
+    lines = parser.add_mutually_exclusive_group(required=True)
+    lines.add_argument("--stop-line", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                       help="Две точки стоп-линии")
+    lines.add_argument("--camera-config", help="Файл настройки камеры с несколькими стоп-линиями (.json)")
+    parser.add_argument("--model", default="yolo11n.pt", help="Веса модели")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Бэкенд инференса (onnx, openvino и int8 готовятся один раз рядом с .pt)")
+    parser.add_argument("--batch-size", type=int, default=16, help="Кадров в одном вызове модели")
+    parser.add_argument("--kernel-size", type=int, default=3, help="Размер ядра фильтра шума")
+    parser.add_argument("--denoise", choices=DENOISE_FILTERS, default=DEFAULT_DENOISE, help="Фильтр шума")
+    parser.add_argument("--target-size", type=int, default=DEFAULT_TARGET_SIZE,
+                        help="Уменьшать кадр до этой длинной стороны перед фильтром (по умолчанию не уменьшать)")
+    parser.add_argument("--output", default="results.jsonl", help="Файл результатов (.jsonl или .csv)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Формат вывода (по умолчанию по расширению)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Процессов с собственной моделью (0 — один процесс с пакетами --batch-size)")
+    parser.add_argument("--threads", type=int, default=1, help="Потоков torch и OpenCV на процесс")
+    parser.add_argument("--metrics", help="Файл для метрик стадий (.json или .prom)")
+    args = parser.parse_args()
+
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    if args.camera_config:
+        stop_line_points = CameraConfig.from_file(args.camera_config)
+    else:
+        x1, y1, x2, y2 = args.stop_line
+        stop_line_points = [(x1, y1), (x2, y2)]
+
+    paths = list_images(args.source)
+    if not paths:
+        print(f"Изображения не найдены: {args.source}")
+        return
+
+    if args.workers > 0:
+        with InferencePool(args.model, args.backend, args.workers, args.threads, args.kernel_size,
+                           args.denoise, args.target_size or None, stop_line_points=stop_line_points) as pool:
+            start_time = time.time()
+            count = write_results(run_pool(pool, paths), args.output, output_format)
+            elapsed_time = time.time() - start_time
+    else:
+        model = load_model(args.model, args.backend)
+
+        start_time = time.time()
+        preprocessor = Preprocessor(args.kernel_size, args.denoise, args.target_size or None)
+        records = run_batch(model, paths, stop_line_points, args.batch_size, args.kernel_size, preprocessor)
+        count = write_results(records, args.output, output_format)
+        elapsed_time = time.time() - start_time
+
+    print(f"Обработано {count} изображений за {elapsed_time:.3f} секунд, результаты в {args.output}")
+    if args.metrics:
+        METRICS.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
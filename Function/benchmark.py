@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import cv2
+import numpy as np
+
+from batchDetect import list_images
+from modelRegistry import BACKENDS, exported_path, file_size_mb, load_model
+from preprocessing import Preprocessor
+
+BENCHMARK_FILE = "benchmark.json"
+IMAGE_DIRS = ("../Images", "../photo")
+PERCENTILES = (50, 95, 99)
+
+
+def peak_rss_mb():
+    """Пиковый объём памяти процесса (МБ)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # macOS отдаёт байты, Linux — КБ
+
+
+def latency_stats(times_ms):
+    stats = {f"p{p}": float(np.percentile(times_ms, p)) for p in PERCENTILES}
+    stats['mean'] = float(np.mean(times_ms))
+    return stats
+
+
+def benchmark_model(weights, backend, imgsz, frames, batch_sizes=(1, 4, 8), warmup=3, repeats=20, kernel_size=3):
+    """
+    Замеряет одну комбинацию модель/бэкенд/размер входа.
+
+    Задержка считается по одиночным кадрам (repeats прогонов по набору кадров
+    после warmup прогревочных), пропускная способность — по пачкам каждого
+    размера из batch_sizes. Предобработка замеряется отдельно от модели:
+    в модель идёт кадр после предобработки по умолчанию (полное разрешение,
+    как в интерфейсах, batchDetect и сервисе), а уменьшение до imgsz перед
+    фильтром (--target-size) замеряется рядом для сравнения.
+
+    Returns:
+        dict: Задержки (p50/p95/p99/mean, мс), кадров в секунду по размерам пачки,
+              размер модели и пиковая память процесса
+    """
+    model = load_model(weights, backend, imgsz)
+    path = weights if backend == "torch" else exported_path(weights, backend)
+
+    preprocessor = Preprocessor(kernel_size)
+    downscaler = Preprocessor(kernel_size, target_size=imgsz)
+    preprocess_times = []
+    downscaled_times = []
+    images = []
+    for frame in frames:
+        start_time = time.perf_counter()
+        images.append(preprocessor(frame)[0])
+        preprocess_times.append((time.perf_counter() - start_time) * 1000)
+
+        start_time = time.perf_counter()
+        downscaler(frame)
+        downscaled_times.append((time.perf_counter() - start_time) * 1000)
+
+    for i in range(warmup):
+        model(images[i % len(images)], imgsz=imgsz, verbose=False)
+
+    times_ms = []
+    for i in range(repeats):
+        start_time = time.perf_counter()
+        model(images[i % len(images)], imgsz=imgsz, verbose=False)
+        times_ms.append((time.perf_counter() - start_time) * 1000)
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        model(batch, imgsz=imgsz, verbose=False)  # прогрев под этот размер пачки
+
+        count = max(1, repeats // batch_size)
+        start_time = time.perf_counter()
+        for _ in range(count):
+            model(batch, imgsz=imgsz, verbose=False)
+        throughput[str(batch_size)] = count * batch_size / (time.perf_counter() - start_time)
+
+    return {
+        'model': os.path.splitext(os.path.basename(weights))[0],
+        'weights': weights,
+        'backend': backend,
+        'imgsz': imgsz,
+        'size_mb': file_size_mb(path),
+        'latency_ms': latency_stats(times_ms),
+        'preprocess_ms': latency_stats(preprocess_times),
+        'preprocess_downscaled_ms': latency_stats(downscaled_times),
+        'images_per_sec': throughput,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def run_isolated(*args, **kwargs):
+    """
+    Запускает benchmark_model в отдельном процессе, чтобы пиковая память
+    одной модели не досталась следующим.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(benchmark_model, *args, **kwargs).result()
+
+
+def find_regressions(results, baseline, tolerance=0.1):
+    """
+    Сравнивает p50 задержки с прошлым прогоном.
+
+    Returns:
+        list: [(ключ, было мс, стало мс), ...] для комбинаций, ставших медленнее больше чем на tolerance
+    """
+    previous = {(r['model'], r['backend'], r['imgsz']): r['latency_ms']['p50'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = (result['model'], result['backend'], result['imgsz'])
+        if key in previous and result['latency_ms']['p50'] > previous[key] * (1 + tolerance):
+            regressions.append((key, previous[key], result['latency_ms']['p50']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер задержки, пропускной способности и памяти моделей")
+    parser.add_argument("--models", nargs="+", default=["yolo11n.pt", "yolo11s.pt", "yolo11m.pt"], help="Веса моделей")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["torch"], help="Бэкенды инференса")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="Размеры входа модели")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8], help="Размеры пачки для пропускной способности")
+    parser.add_argument("--images", nargs="+", default=list(IMAGE_DIRS), help="Папки с кадрами")
+    parser.add_argument("--warmup", type=int, default=3, help="Прогревочных прогонов")
+    parser.add_argument("--repeats", type=int, default=20, help="Замеряемых прогонов")
+    parser.add_argument("--output", default=BENCHMARK_FILE, help="Файл результатов (.json)")
+    parser.add_argument("--baseline", help="Прошлый файл результатов для поиска регрессий")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Допустимое замедление p50 (доля)")
+    args = parser.parse_args()
+
+    paths = [path for directory in args.images for path in list_images(directory)]
+    frames = [frame for frame in map(cv2.imread, paths) if frame is not None]
+    if not frames:
+        print(f"Изображения не найдены: {', '.join(args.images)}")
+        return
+
+    results = []
+    for weights in args.models:
+        for backend in args.backends:
+            for imgsz in args.imgsz:
+                result = run_isolated(weights, backend, imgsz, frames, args.batch_sizes, args.warmup, args.repeats)
+                results.append(result)
+
+                latency = result['latency_ms']
+                throughput = ", ".join(f"{b}: {v:.1f}" for b, v in result['images_per_sec'].items())
+                print(f"{result['model']} [{backend}, {imgsz}]: p50 {latency['p50']:.1f} мс, "
+                      f"p95 {latency['p95']:.1f} мс, p99 {latency['p99']:.1f} мс; "
+                      f"кадров/с по пачкам {throughput}; память {result['peak_rss_mb']:.0f} МБ")
+                print(f"  предобработка p50: {result['preprocess_ms']['p50']:.1f} мс, "
+                      f"с уменьшением до {imgsz}: {result['preprocess_downscaled_ms']['p50']:.1f} мс")
+
+    report = {
+        'date': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'images': len(frames),
+        'warmup': args.warmup,
+        'repeats': args.repeats,
+        'results': results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for (model, backend, imgsz), before, after in regressions:
+            print(f"Регрессия {model} [{backend}, {imgsz}]: p50 {before:.1f} -> {after:.1f} мс")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+from Detected import TRAFFIC_LIGHT_CLASS, box_iou, classify_traffic_lights, split_detections
+from modelRegistry import BACKENDS, load_model
+from tiledInference import TiledDetector
+
+CALIBRATION_DIR = "../calibration"
+
+
+def merge_light_boxes(detections, min_iou=0.5, min_share=0.5):
+    """
+    Объединяет рамки светофоров, найденные на нескольких кадрах.
+
+    Args:
+        detections: Список рамок для каждого кадра [[(x1, y1, x2, y2), ...], ...]
+        min_iou: Минимальный IoU, при котором рамки считаются одним светофором
+        min_share: Доля кадров, на которых светофор должен быть найден
+
+    Returns:
+        list: Усреднённые рамки устойчиво найденных светофоров
+    """
+    groups = []  # [[box, ...], ...]
+    for boxes in detections:
+        for box in boxes:
+            if groups:
+                centers = [np.mean(group, axis=0) for group in groups]
+                ious = box_iou([box], centers)[0]
+                best = int(ious.argmax())
+                if ious[best] >= min_iou:
+                    groups[best].append(box)
+                    continue
+            groups.append([box])
+
+    min_count = max(1, int(len(detections) * min_share))
+    return [tuple(int(round(v)) for v in np.mean(group, axis=0)) for group in groups if len(group) >= min_count]
+
+
+class TrafficLightCalibration:
+    """
+    Сохранённые рамки светофоров неподвижной камеры.
+
+    После калибровки светофоры не ищутся моделью на каждом кадре: вырезаются
+    сохранённые области и по ним определяется цвет. Раз в validate_interval
+    кадров модель проверяет, не сдвинулась ли камера, и при сдвиге рамки
+    обновляются и сохраняются.
+
+    С tiler (TiledDetector) светофоры при калибровке и проверке ищутся по
+    плиткам в полном разрешении — так находятся далёкие мелкие светофоры.
+    """
+
+    def __init__(self, camera_id, boxes=None, validate_interval=900, min_iou=0.5, directory=CALIBRATION_DIR,
+                 tiler=None):
+        self.camera_id = camera_id
+        self.boxes = [tuple(box) for box in boxes or []]
+        self.validate_interval = validate_interval
+        self.min_iou = min_iou
+        self.directory = directory
+        self.tiler = tiler
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.camera_id}.json")
+
+    @classmethod
+    def load(cls, camera_id, directory=CALIBRATION_DIR, **kwargs):
+        """Загружает калибровку камеры или возвращает None, если её ещё нет."""
+        path = os.path.join(directory, f"{camera_id}.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(camera_id, data['traffic_lights'], directory=directory, **kwargs)
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({'camera_id': self.camera_id, 'traffic_lights': self.boxes}, f, indent=2)
+
+    def detect_lights(self, model, frames):
+        if self.tiler is not None:
+            return [self.tiler.detect_traffic_lights(model, frame) for frame in frames]
+        results = model(list(frames), classes=[TRAFFIC_LIGHT_CLASS], verbose=False)
+        return [split_detections(result)[1] for result in results]
+
+    def calibrate(self, model, frames):
+        """Находит светофоры на нескольких кадрах и сохраняет устойчивые рамки."""
+        detections = self.detect_lights(model, frames)
+        self.boxes = merge_light_boxes(detections, self.min_iou)
+        self.save()
+        return self.boxes
+
+    def classify(self, frame):
+        """
+        Определяет состояние сохранённых светофоров без запуска модели.
+
+        Returns:
+            list: [{'box': (x1, y1, x2, y2), 'state': str}, ...]
+        """
+        states = classify_traffic_lights(frame, self.boxes)
+        return [{'box': box, 'state': state} for box, state in zip(self.boxes, states)]
+
+    def needs_validation(self, frame_index):
+        return self.validate_interval > 0 and frame_index % self.validate_interval == 0
+
+    def validate(self, model, frame):
+        """
+        Проверяет сохранённые рамки по свежей детекции.
+        Если совпало меньше половины светофоров, камера считается сдвинутой
+        и рамки заменяются найденными.
+
+        Returns:
+            bool: True, если рамки были обновлены
+        """
+        detected = self.detect_lights(model, [frame])[0]
+        if not detected:
+            return False
+
+        if self.boxes:
+            matched = int((box_iou(self.boxes, detected).max(axis=1) >= self.min_iou).sum())
+            if matched * 2 >= len(self.boxes):
+                return False
+
+        self.boxes = detected
+        self.save()
+        return True
+
+
+def read_frames(source, count):
+    """Читает до count кадров из видео или из папки с изображениями."""
+    if os.path.isdir(source):
+        names = sorted(os.listdir(source))[:count]
+        frames = [cv2.imread(os.path.join(source, name)) for name in names]
+        return [frame for frame in frames if frame is not None]
+
+    cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Калибровка светофоров для неподвижной камеры")
+    parser.add_argument("source", help="Видеофайл, URL потока, номер камеры или папка с кадрами")
+    parser.add_argument("--camera-id", required=True, help="Идентификатор камеры")
+    parser.add_argument("--model", default="yolo11n.pt", help="Веса модели")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Бэкенд инференса (onnx, openvino и int8 готовятся один раз рядом с .pt)")
+    parser.add_argument("--frames", type=int, default=10, help="Сколько кадров использовать")
+    parser.add_argument("--directory", default=CALIBRATION_DIR, help="Папка для файлов калибровки")
+    parser.add_argument("--tiles", action="store_true", help="Искать светофоры по плиткам в полном разрешении")
+    parser.add_argument("--tile-size", type=int, default=640, help="Сторона плитки")
+    parser.add_argument("--light-roi", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                        help="Область светофоров, плитки покрывают только её")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        print(f"Не удалось прочитать кадры: {args.source}")
+        return
+
+    tiler = TiledDetector(args.tile_size, roi=args.light_roi) if args.tiles else None
+    calibration = TrafficLightCalibration(args.camera_id, directory=args.directory, tiler=tiler)
+    boxes = calibration.calibrate(load_model(args.model, args.backend), frames)
+    print(f"Найдено светофоров: {len(boxes)}, калибровка сохранена в {calibration.path}")
+
+
+if __name__ == "__main__":
+    main()
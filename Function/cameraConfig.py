@@ -0,0 +1,202 @@
+import json
+import os
+
+import numpy as np
+
+from Detected import classify_traffic_lights
+from spatialIndex import LineBandIndex, bottom_centers, segment_distances
+from stopLine import StopLine
+
+CONFIG_DIR = "../cameras"
+
+
+class Approach:
+    """
+    Одно направление перекрёстка: своя стоп-линия с направлением движения
+    и порогом и область, в которой стоит светофор этого направления.
+
+    Args:
+        name: Название направления (например, "север")
+        stop_line: StopLine направления
+        light_roi: Область светофора (x1, y1, x2, y2) или None — первый светофор кадра
+    """
+
+    def __init__(self, name, stop_line, light_roi=None):
+        self.name = name
+        self.stop_line = stop_line
+        self.light_roi = tuple(light_roi) if light_roi is not None else None
+
+    @classmethod
+    def from_dict(cls, data):
+        stop_line = StopLine.from_points(data['stop_line'], data.get('threshold', 50), data.get('direction', 1))
+        return cls(data['name'], stop_line, data.get('light_roi'))
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'stop_line': [list(self.stop_line.point1), list(self.stop_line.point2)],
+            'direction': self.stop_line.direction,
+            'threshold': self.stop_line.threshold,
+            'light_roi': list(self.light_roi) if self.light_roi is not None else None
+        }
+
+    def owns_light(self, box):
+        """Светофор относится к направлению, если центр его рамки внутри light_roi."""
+        if self.light_roi is None:
+            return True
+        x1, y1, x2, y2 = self.light_roi
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        return x1 <= cx <= x2 and y1 <= cy <= y2
+
+
+class CameraConfig:
+    """
+    Настройка камеры с несколькими направлениями (стоп-линиями) перекрёстка.
+
+    Модель запускается на кадре один раз. Каждая машина относится к ближайшей
+    стоп-линии (по расстоянию от центра нижней границы рамки до отрезка линии)
+    среди линий, чьи полосы задевает её рамка — их находит сеточный индекс,
+    построенный один раз для камеры. Затем машина проверяется только
+    относительно своей линии и светофора своего направления. Машина вне
+    полос всех линий не считается заехавшей за линию.
+
+    Файл настройки — JSON в папке CONFIG_DIR:
+        {"camera_id": "...", "approaches": [{"name": "...", "stop_line": [[x1, y1], [x2, y2]],
+          "direction": 1, "threshold": 50, "light_roi": [x1, y1, x2, y2]}, ...]}
+    """
+
+    def __init__(self, camera_id, approaches, directory=CONFIG_DIR):
+        if not approaches:
+            raise ValueError("Нужна хотя бы одна стоп-линия")
+        names = [approach.name for approach in approaches]
+        if len(set(names)) != len(names):
+            raise ValueError("Названия направлений должны различаться")
+
+        self.camera_id = camera_id
+        self.approaches = list(approaches)
+        self.directory = directory
+
+        self.index = LineBandIndex([approach.stop_line for approach in self.approaches])
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.camera_id}.json")
+
+    @property
+    def lines(self):
+        """Точки всех стоп-линий [[(x1, y1), (x2, y2)], ...] для отрисовки."""
+        return [[approach.stop_line.point1, approach.stop_line.point2] for approach in self.approaches]
+
+    @classmethod
+    def load(cls, camera_id, directory=CONFIG_DIR):
+        with open(os.path.join(directory, f"{camera_id}.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(camera_id, [Approach.from_dict(item) for item in data['approaches']], directory)
+
+    @classmethod
+    def from_file(cls, path):
+        """Загружает настройку по пути к файлу; идентификатор камеры — имя файла."""
+        directory, name = os.path.split(path)
+        return cls.load(os.path.splitext(name)[0], directory or ".")
+
+    def save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({'camera_id': self.camera_id,
+                       'approaches': [approach.to_dict() for approach in self.approaches]},
+                      f, ensure_ascii=False, indent=2)
+
+    def region(self, width, height, margin=200):
+        """Общая полоса поиска машин вокруг всех стоп-линий (см. StopLine.region)."""
+        regions = np.array([approach.stop_line.region(width, height, margin) for approach in self.approaches])
+        return (int(regions[:, 0].min()), int(regions[:, 1].min()),
+                int(regions[:, 2].max()), int(regions[:, 3].max()))
+
+    def nearest_lines(self, boxes):
+        """
+        Номер ближайшей стоп-линии для каждой машины среди всех линий.
+
+        Args:
+            boxes: Массив формы (N, 4) в формате x1, y1, x2, y2
+
+        Returns:
+            numpy.ndarray: Индексы линий формы (N,)
+        """
+        points = bottom_centers(np.asarray(boxes, dtype=np.float64))
+        distance = segment_distances(points[:, None], self.index.starts[None], self.index.vectors[None])
+        return distance.argmin(axis=1)
+
+    def evaluate_boxes(self, boxes):
+        """
+        Проверяет все машины, каждую — относительно её ближайшей линии.
+
+        Returns:
+            tuple: (line_index, is_over, distance) — массивы формы (N,), как в StopLine.evaluate_boxes
+        """
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        line_index = np.zeros(len(boxes), dtype=int)
+        is_over = np.zeros(len(boxes), dtype=bool)
+        distance = np.zeros(len(boxes))
+        if len(boxes) == 0:
+            return line_index, is_over, distance
+
+        line_index = self.index.nearest(boxes)
+        outside = line_index < 0
+        if outside.any():
+            # Расстояние для машин вне полос считается до ближайшей линии
+            line_index[outside] = self.nearest_lines(boxes[outside])
+        for i, approach in enumerate(self.approaches):
+            mask = line_index == i
+            if mask.any():
+                is_over[mask], distance[mask] = approach.stop_line.evaluate_boxes(boxes[mask])
+
+        is_over[outside] = False
+        distance[outside] = np.abs(distance[outside])
+        return line_index, is_over, distance
+
+    def analyze(self, frame, car_boxes, traffic_light_boxes, traffic_light_states=None):
+        """
+        То же, что Detected.analyze_frame, но для всех направлений сразу.
+
+        Returns:
+            dict: Поля analyze_frame ('traffic_light_state' — состояние первого направления)
+                  и 'approaches': [{'name', 'traffic_light_state', 'violations'}, ...];
+                  у каждой машины добавлено поле 'approach'
+        """
+        states = traffic_light_states
+        if states is None:
+            states = classify_traffic_lights(frame, traffic_light_boxes)
+        traffic_lights = [{'box': tuple(box), 'state': state} for box, state in zip(traffic_light_boxes, states)]
+
+        # Как и в analyze_frame, решение принимается по первому светофору направления
+        approaches = []
+        for approach in self.approaches:
+            state = next((light['state'] for light in traffic_lights if approach.owns_light(light['box'])),
+                         "unknown")
+            approaches.append({'name': approach.name, 'traffic_light_state': state, 'violations': 0})
+
+        boxes = [tuple(box[:4]) for box in car_boxes if len(box) >= 4]
+        line_index, is_over, distance = self.evaluate_boxes(boxes)
+
+        cars = []
+        violations = 0
+        for box, index, box_is_over, box_distance in zip(boxes, line_index, is_over, distance):
+            approach = approaches[index]
+            violation = bool(box_is_over) and approach['traffic_light_state'] == "red"
+            approach['violations'] += violation
+            violations += violation
+            cars.append({
+                'box': box,
+                'is_over': bool(box_is_over),
+                'distance': float(box_distance),
+                'approach': approach['name'],
+                'violation': violation
+            })
+
+        return {
+            'traffic_light_state': approaches[0]['traffic_light_state'],
+            'traffic_lights': traffic_lights,
+            'approaches': approaches,
+            'cars': cars,
+            'violations': violations
+        }
@@ -2,44 +2,50 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 import cv2
-from ultralytics import YOLO
-import time
+from functools import partial
 from roundButton import create_rounded_button
+from inferenceWorker import InferenceWorker
+from metrics import METRICS
+from modelRegistry import BACKENDS, DEFAULT_MODEL, ModelRegistry
+from detectionCache import DETECTION_CACHE, image_key
 from Detected import detect_cars_over_stopline, detect_traffic_light_state
 
 model = None
 image = None
 detected_image = None
 original_cv2 = None
+original_rgb = None  # Та же картинка в RGB для PIL и разметки, переводится один раз при открытии
+original_key = None  # Ключ текущего изображения в кэше детекций
 stop_line_points = []
 image_scale_info = {}
 
-def load_model(model_path="yolo11n.pt"):
+def load_model(label=DEFAULT_MODEL, backend=None):
+    if registry.is_loaded(label, backend):
+        status_label.config(text=f"Переключаемся на {label}...", fg="#b993d6")
+    else:
+        status_label.config(text=f"Загружаем {label}...", fg="#b993d6")
+    worker.submit("model", partial(registry.get, label, backend),
+                  partial(on_model_loaded, label), partial(on_model_error, label))
+
+
+def on_model_loaded(label, loaded_model):
     global model, current_model_name
-    try:
-        status_label.config(text=f"Загружаем {model_path}...", fg="#b993d6")
-        root.update()
-        model = YOLO(model_path)
-        current_model_name = model_path
-        status_label.config(text=f"Модель {model_path} загружена", fg="lightgreen")
-    except Exception as e:
-        status_label.config(text=f"Ошибка загрузки {model_path}", fg="#ff6b6b")
-        print(f"Ошибка: {e}")
+    model = loaded_model
+    current_model_name = label
+    status_label.config(text=f"Модель {label} загружена", fg="lightgreen")
+
+
+def on_model_error(label, e):
+    status_label.config(text=f"Ошибка загрузки {label}", fg="#ff6b6b")
+    print(f"Ошибка: {e}")
 
 
 def switch_model(event=None):
-    selected = model_selector.get()
-    model_map = {
-        "YOLO11n (быстро)": "yolo11n.pt",
-        "YOLO11s (баланс)": "yolo11s.pt",
-        "YOLO11m (точно)": "yolo11m.pt"
-    }
-    if selected in model_map:
-        load_model(model_map[selected])
+    load_model(model_selector.get(), backend_selector.get())
 
 
 def open_image():
-    global image, original_cv2, detected_image, stop_line_points
+    global image, original_cv2, original_rgb, original_key, detected_image, stop_line_points
 
     filepath = filedialog.askopenfilename(
         title="Выберите изображение",
@@ -56,10 +62,13 @@ def open_image():
         img_rgb = cv2.cvtColor(img_cv2, cv2.COLOR_BGR2RGB)
         pil_img = Image.fromarray(img_rgb)
 
-        image = pil_img.copy()
-        original_cv2 = img_cv2.copy()
+        image = pil_img
+        original_cv2 = img_cv2
+        original_rgb = img_rgb
+        original_key = image_key(original_cv2)
         detected_image = None
         stop_line_points = []
+        worker.cancel("detect")
 
         show_image(pil_img, canvas_before)
         clear_canvas(canvas_after)
@@ -119,8 +128,7 @@ def set_stop_line(event):
                             fg="#b993d6")
 
 
-    img_rgb = cv2.cvtColor(original_cv2, cv2.COLOR_BGR2RGB)
-    annotated = img_rgb.copy()
+    annotated = original_rgb.copy()
 
     for point in stop_line_points:
         cv2.circle(annotated, point, 5, (255, 0, 0), -1)
@@ -135,8 +143,6 @@ def set_stop_line(event):
 
 
 def detect_cars_over_stop_line():
-    global image, detected_image, original_cv2, stop_line_points
-
     if original_cv2 is None:
         messagebox.showwarning("Внимание", "Сначала загрузите изображение!")
         return
@@ -149,56 +155,60 @@ def detect_cars_over_stop_line():
         messagebox.showwarning("Внимание", "Сначала установите стоп-линию!")
         return
 
-    try:
-        img_preprocessed = preprocess_image(original_cv2, kernel_size=3)
-        start_time = time.time()
+    status_label.config(text="Выполняется детекция...", fg="#b993d6")
+    worker.submit("detect",
+                  partial(check_stop_line, model, original_cv2, original_rgb, original_key, list(stop_line_points)),
+                  show_stop_line_result, show_detection_error)
+
 
-        car_results_model = model(img_preprocessed, classes=[2], verbose=False)
+def check_stop_line(model, original_cv2, original_rgb, original_key, stop_line_points):
+    """Выполняется в фоновом потоке: детекция и разметка без обращения к окну."""
+    timings = METRICS.frame()
+    METRICS.inc("frames")
 
-        traffic_light_results = model(img_preprocessed, classes=[9], verbose=False)
+    with timings.stage("preprocess"):
+        DETECTION_CACHE.preprocess(original_cv2, kernel_size=3, key=original_key)
 
-        elapsed_time = time.time() - start_time
-        annotated_cv2 = original_cv2.copy()
+    with timings.stage("inference"):
+        car_boxes, traffic_light_boxes = DETECTION_CACHE.detect_cars_and_traffic_lights(
+            model, original_cv2, kernel_size=3, key=original_key)
+    METRICS.inc("cars_found", len(car_boxes))
+    METRICS.inc("traffic_lights_found", len(traffic_light_boxes))
 
-        car_boxes_list = car_results_model[0].boxes
-        if len(car_boxes_list) == 0:
-            status_label.config(text="Машина не найдена", fg="#ffb347")
-            show_image(image, canvas_after)
-            detected_image = image.copy()
-            return
+    annotated_rgb = original_rgb.copy()  # рисуем сразу в RGB, без перевода результата
 
-        car_boxes = []
-        for box in car_boxes_list:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            car_boxes.append((x1, y1, x2, y2))
+    if len(car_boxes) == 0:
+        return {'image': None, 'violations': 0, 'timings': timings}
 
-        traffic_light_state = "unknown"
-        traffic_light_boxes = traffic_light_results[0].boxes
+    traffic_light_state = "unknown"
 
-        if len(traffic_light_boxes) > 0:
-            tl_box = traffic_light_boxes[0]
-            tl_x1, tl_y1, tl_x2, tl_y2 = map(int, tl_box.xyxy[0])
+    if len(traffic_light_boxes) > 0:
+        tl_x1, tl_y1, tl_x2, tl_y2 = traffic_light_boxes[0]
+        with timings.stage("classify"):
             tl_roi = original_cv2[tl_y1:tl_y2, tl_x1:tl_x2]
             traffic_light_state = detect_traffic_light_state(tl_roi)
-
-            color_map = {
-                "red": (0, 0, 255),
-                "yellow": (0, 255, 255),
-                "green": (0, 255, 0),
-                "unknown": (128, 128, 128)
-            }
-            tl_color = color_map.get(traffic_light_state, (128, 128, 128))
-            cv2.rectangle(annotated_cv2, (tl_x1, tl_y1), (tl_x2, tl_y2), tl_color, 3)
-            cv2.putText(annotated_cv2, f"TRAFFIC LIGHT: {traffic_light_state.upper()}",
-                        (tl_x1, tl_y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, tl_color, 2)
-
+        METRICS.inc("traffic_lights_classified")
+
+        color_map = {
+            "red": (255, 0, 0),
+            "yellow": (255, 255, 0),
+            "green": (0, 255, 0),
+            "unknown": (128, 128, 128)
+        }
+        tl_color = color_map.get(traffic_light_state, (128, 128, 128))
+        cv2.rectangle(annotated_rgb, (tl_x1, tl_y1), (tl_x2, tl_y2), tl_color, 3)
+        cv2.putText(annotated_rgb, f"TRAFFIC LIGHT: {traffic_light_state.upper()}",
+                    (tl_x1, tl_y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, tl_color, 2)
+
+    with timings.stage("postprocess"):
         car_results = detect_cars_over_stopline(car_boxes, stop_line_points)
 
-        cv2.line(annotated_cv2, stop_line_points[0], stop_line_points[1], (0, 0, 255), 3)
-        cv2.circle(annotated_cv2, stop_line_points[0], 5, (0, 0, 255), -1)
-        cv2.circle(annotated_cv2, stop_line_points[1], 5, (0, 0, 255), -1)
-        cv2.putText(annotated_cv2, "STOP LINE", (stop_line_points[0][0], stop_line_points[0][1] - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+    with timings.stage("render"):
+        cv2.line(annotated_rgb, stop_line_points[0], stop_line_points[1], (255, 0, 0), 3)
+        cv2.circle(annotated_rgb, stop_line_points[0], 5, (255, 0, 0), -1)
+        cv2.circle(annotated_rgb, stop_line_points[1], 5, (255, 0, 0), -1)
+        cv2.putText(annotated_rgb, "STOP LINE", (stop_line_points[0][0], stop_line_points[0][1] - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
 
         cars_over_count = 0
         for i, result in enumerate(car_results):
@@ -215,30 +225,45 @@ def detect_cars_over_stop_line():
                     is_violation = False
 
             if is_violation:
-                cv2.rectangle(annotated_cv2, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                cv2.putText(annotated_cv2, "VIOLATION", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                cv2.rectangle(annotated_rgb, (x1, y1), (x2, y2), (255, 0, 0), 3)
+                cv2.putText(annotated_rgb, "VIOLATION", (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
                 cars_over_count += 1
             elif is_over:
-                cv2.rectangle(annotated_cv2, (x1, y1), (x2, y2), (0, 250, 0), 3)
+                cv2.rectangle(annotated_rgb, (x1, y1), (x2, y2), (0, 250, 0), 3)
             else:
-                cv2.rectangle(annotated_cv2, (x1, y1), (x2, y2), (0, 250, 0), 3)
+                cv2.rectangle(annotated_rgb, (x1, y1), (x2, y2), (0, 250, 0), 3)
+    METRICS.inc("violations", cars_over_count)
 
-        annotated_rgb = cv2.cvtColor(annotated_cv2, cv2.COLOR_BGR2RGB)
+    with timings.stage("convert"):
         pil_result = Image.fromarray(annotated_rgb)
 
-        detected_image = pil_result.copy()
-        show_image(pil_result, canvas_after)
+    return {'image': pil_result, 'violations': cars_over_count, 'timings': timings}
 
-        traffic_light_info = f", светофор: {traffic_light_state.upper()}" if traffic_light_state != "unknown" else ""
-        status_label.config(
-            text=f"Обнаружено нарушений: {cars_over_count}",
-            fg="lightgreen" if cars_over_count == 0 else "#ff6b6b"
-        )
-        print(f"Время {elapsed_time:.3f} секунд")
 
-    except Exception as e:
-        messagebox.showerror("Ошибка", f"Не удалось выполнить детекцию: {str(e)}")
+def show_stop_line_result(result):
+    global detected_image
+
+    if result['image'] is None:
+        status_label.config(text="Машина не найдена", fg="#ffb347")
+        show_image(image, canvas_after)
+        detected_image = image.copy()
+        return
+
+    detected_image = result['image']
+    show_image(detected_image, canvas_after)
+
+    cars_over_count = result['violations']
+    status_label.config(
+        text=f"Обнаружено нарушений: {cars_over_count}",
+        fg="lightgreen" if cars_over_count == 0 else "#ff6b6b"
+    )
+    print(f"Время: {result['timings']}")
+
+
+def show_detection_error(e):
+    status_label.config(text="Ошибка детекции", fg="#ff6b6b")
+    messagebox.showerror("Ошибка", f"Не удалось выполнить детекцию: {str(e)}")
 
 
 def show_image(pil_image, canvas):
@@ -254,8 +279,9 @@ def show_image(pil_image, canvas):
     new_w = int(img_w * ratio)
     new_h = int(img_h * ratio)
 
-    resized = pil_image.resize((new_w, new_h), Image.LANCZOS)
-    photo = ImageTk.PhotoImage(resized)
+    with METRICS.timer("display"):
+        resized = pil_image.resize((new_w, new_h), Image.LANCZOS)
+        photo = ImageTk.PhotoImage(resized)
 
     canvas.delete("all")
     canvas.create_image(canvas_w // 2, canvas_h // 2, image=photo, anchor="center")
@@ -301,15 +327,7 @@ def save_result():
         messagebox.showerror("Ошибка", "Не удалось сохранить файл")
 
 
-def preprocess_image(img_cv2, kernel_size=3):
-    if kernel_size % 2 == 0:
-        raise ValueError("Размер ядра должен быть нечётным числом")
-
-    img_rgb = cv2.cvtColor(img_cv2, cv2.COLOR_BGR2RGB)
-    img_denoised = cv2.medianBlur(img_rgb, kernel_size)
-
-    return img_denoised
-
+registry = ModelRegistry()
 
 root = tk.Tk()
 root.title("Обнаружение светофоров")
@@ -336,15 +354,32 @@ model_label.pack(side="left", padx=(0, 5))
 
 model_selector = ttk.Combobox(
     top_frame,
-    values=["YOLO11n (быстро)", "YOLO11s (баланс)", "YOLO11m (точно)"],
+    values=registry.labels(),
     state="readonly",
     width=18,
     font=("Segoe UI", 10)
 )
-model_selector.set("YOLO11n (быстро)")
+model_selector.set(DEFAULT_MODEL)
 model_selector.pack(side="left", padx=(0, 15))
 model_selector.bind("<<ComboboxSelected>>", switch_model)
 
+backend_label = tk.Label(
+    top_frame, text="Бэкенд:",
+    bg=BG_COLOR, fg="#cccccc", font=("Segoe UI", 10)
+)
+backend_label.pack(side="left", padx=(0, 5))
+
+backend_selector = ttk.Combobox(
+    top_frame,
+    values=BACKENDS,
+    state="readonly",
+    width=9,
+    font=("Segoe UI", 10)
+)
+backend_selector.set(registry.backend)
+backend_selector.pack(side="left", padx=(0, 15))
+backend_selector.bind("<<ComboboxSelected>>", switch_model)
+
 style = ttk.Style()
 style.theme_use('clam')
 style.configure(
@@ -407,5 +442,6 @@ right_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
 canvas_after = tk.Canvas(right_frame, bg="#2d2d3a", highlightthickness=0)
 canvas_after.pack(fill="both", expand=True, padx=5, pady=5)
 
-root.after(100, lambda: load_model("yolo11n.pt"))
+worker = InferenceWorker(root)
+root.after(100, load_model)
 root.mainloop()
\ No newline at end of file
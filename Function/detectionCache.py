@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, split_detections
+from preprocessing import Preprocessor
+
+
+def image_key(img_cv2):
+    """Ключ изображения по содержимому: одинаковые кадры дают одинаковый ключ."""
+    digest = hashlib.blake2b(img_cv2.tobytes(), digest_size=16).hexdigest()
+    return f"{img_cv2.shape}:{img_cv2.dtype}:{digest}"
+
+
+class LRUCache:
+    """
+    Кэш с вытеснением давно не использованных записей (LRU), ограниченный
+    числом записей и суммарным объёмом в байтах.
+    """
+
+    def __init__(self, max_items=16, max_mb=256):
+        self.max_items = max_items
+        self.max_bytes = max_mb * 2**20
+        self.items = OrderedDict()  # ключ -> (значение, объём в байтах)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            return self.items[key][0]
+
+    def put(self, key, value, size_bytes=0):
+        with self.lock:
+            if key in self.items:
+                self.total_bytes -= self.items.pop(key)[1]
+            self.items[key] = (value, size_bytes)
+            self.total_bytes += size_bytes
+
+            while len(self.items) > 1 and (len(self.items) > self.max_items or self.total_bytes > self.max_bytes):
+                _, (_, size) = self.items.popitem(last=False)
+                self.total_bytes -= size
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.total_bytes = 0
+
+
+def results_size(result):
+    size = result.boxes.data.numel() * result.boxes.data.element_size()
+    if result.orig_img is not None:
+        size += result.orig_img.nbytes
+    return size
+
+
+class DetectionCache:
+    """
+    Кэш предобработки и детекций для интерфейсов.
+
+    Предобработанный кадр хранится по ключу (изображение, kernel_size), а
+    результат модели — по (изображение, kernel_size) для конкретной модели.
+    Модель всегда ищет машины и светофоры за один проход, поэтому кнопки
+    "Найти светофор", "Найти машину" и "Проверить стоп-линию" на одном
+    изображении запускают модель один раз.
+    """
+
+    def __init__(self, max_images=8, max_mb=512):
+        self.preprocessed = LRUCache(max_images, max_mb // 2)
+        self.results = LRUCache(max_images, max_mb // 2)
+
+    def preprocess(self, img_cv2, kernel_size=3, key=None):
+        """
+        Returns:
+            tuple: (изображение для модели, масштаб относительно исходного кадра)
+        """
+        key = (key or image_key(img_cv2), kernel_size)
+        prepared = self.preprocessed.get(key)
+        if prepared is None:
+            prepared = Preprocessor(kernel_size)(img_cv2)
+            self.preprocessed.put(key, prepared, prepared[0].nbytes)
+        return prepared
+
+    def detect(self, model, img_cv2, kernel_size=3, key=None):
+        """
+        Возвращает результат модели (Results) для машин и светофоров и масштаб
+        кадра, поданного в модель. Результат другой модели для того же
+        изображения считается промахом.
+        """
+        key = key or image_key(img_cv2)
+        cached = self.results.get((key, kernel_size))
+        if cached is not None and cached[0]() is model:
+            return cached[1], cached[2]
+
+        img_preprocessed, scale = self.preprocess(img_cv2, kernel_size, key)
+        result = model(img_preprocessed, classes=[CAR_CLASS, TRAFFIC_LIGHT_CLASS], verbose=False)[0]
+        self.results.put((key, kernel_size), (weakref.ref(model), result, scale), results_size(result))
+        return result, scale
+
+    def detect_cars_and_traffic_lights(self, model, img_cv2, kernel_size=3, key=None):
+        """То же, что Detected.detect_cars_and_traffic_lights, но с кэшем."""
+        return split_detections(*self.detect(model, img_cv2, kernel_size, key))
+
+    def clear(self):
+        self.preprocessed.clear()
+        self.results.clear()
+
+
+# Общий кэш процесса
+DETECTION_CACHE = DetectionCache()
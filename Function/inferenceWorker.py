@@ -0,0 +1,80 @@
+import queue
+import threading
+
+
+class InferenceWorker:
+    """
+    Фоновый поток для загрузки модели и инференса, чтобы окно Tkinter не зависало.
+
+    Задачи выполняются по очереди в одном потоке, поэтому модель никогда не
+    используется из двух потоков одновременно. Результаты забираются из
+    главного потока через root.after и передаются в обработчики — только там
+    можно обращаться к виджетам.
+
+    Новая задача с тем же ключом вытесняет устаревшую: если старая ещё в
+    очереди, она не выполняется, а если уже выполняется — её результат
+    отбрасывается.
+    """
+
+    def __init__(self, root, poll_interval=30):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, key, task, on_done, on_error=None):
+        """
+        Ставит задачу в очередь.
+
+        Args:
+            key: Тип задачи ("model", "detect", ...); новая задача вытесняет старую с тем же ключом
+            task: Функция без аргументов, выполняется в фоновом потоке
+            on_done: Обработчик результата, вызывается в главном потоке
+            on_error: Обработчик исключения, вызывается в главном потоке
+        """
+        with self.lock:
+            generation = self.latest.get(key, 0) + 1
+            self.latest[key] = generation
+        self.requests.put((key, generation, task, on_done, on_error))
+
+    def cancel(self, key):
+        """Отменяет задачи с этим ключом, которые ещё в очереди или выполняются."""
+        with self.lock:
+            self.latest[key] = self.latest.get(key, 0) + 1
+
+    def is_current(self, key, generation):
+        with self.lock:
+            return self.latest.get(key) == generation
+
+    def _run(self):
+        while True:
+            key, generation, task, on_done, on_error = self.requests.get()
+            if not self.is_current(key, generation):
+                continue
+
+            try:
+                self.results.put((key, generation, on_done, task()))
+            except Exception as e:
+                if on_error is not None:
+                    self.results.put((key, generation, on_error, e))
+                else:
+                    print(f"Ошибка фоновой задачи {key}: {e}")
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    key, generation, callback, value = self.results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if self.is_current(key, generation):
+                    callback(value)
+        finally:
+            self.root.after(self.poll_interval, self._poll)
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Границы корзин гистограммы длительностей, мс
+DEFAULT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами (как в Prometheus)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя корзина — больше всех границ
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q):
+        """Оценка перцентиля по корзинам (верхняя граница корзины)."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(min(bound, self.max))
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'buckets': dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts))
+        }
+
+
+class FrameTimings:
+    """
+    Длительности стадий одного кадра. Каждая стадия одновременно попадает
+    в общие гистограммы Metrics.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+            self.metrics.observe(name, elapsed_ms)
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    def __str__(self):
+        parts = [f"{name} {ms:.1f} мс" for name, ms in self.stages.items()]
+        return f"{', '.join(parts)}; всего {self.total:.1f} мс"
+
+
+class Metrics:
+    """
+    Счётчики и гистограммы длительностей стадий внутри процесса.
+    Потокобезопасны: стадии конвейера пишут в них из разных потоков.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms = OrderedDict()
+        self.counters = OrderedDict()
+        self.lock = threading.Lock()
+
+    def observe(self, stage, elapsed_ms):
+        with self.lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = Histogram(self.buckets)
+            self.histograms[stage].observe(elapsed_ms)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - start_time) * 1000)
+
+    def frame(self):
+        return FrameTimings(self)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'stages_ms': {name: h.to_dict() for name, h in self.histograms.items()},
+                'counters': dict(self.counters)
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix="stopline"):
+        """Текстовый формат Prometheus: гистограмма {prefix}_stage_ms и счётчики {prefix}_<имя>_total."""
+        lines = [f"# TYPE {prefix}_stage_ms histogram"]
+        with self.lock:
+            for name, h in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip([str(b) for b in h.buckets] + ["+Inf"], h.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_ms_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_ms_sum{{stage="{name}"}} {h.sum}')
+                lines.append(f'{prefix}_stage_ms_count{{stage="{name}"}} {h.count}')
+            for name, value in self.counters.items():
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Сохраняет метрики в файл: .prom/.txt — формат Prometheus, иначе JSON."""
+        text = self.to_prometheus() if path.lower().endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+# Общие метрики процесса
+METRICS = Metrics()
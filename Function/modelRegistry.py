@@ -0,0 +1,162 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from ultralytics import YOLO
+
+# Единый список моделей для всех интерфейсов: подпись в списке -> файл весов
+MODELS = OrderedDict([
+    ("YOLO11n (быстро)", "yolo11n.pt"),
+    ("YOLO11s (баланс)", "yolo11s.pt"),
+    ("YOLO11m (точно)", "yolo11m.pt"),
+    ("YOLOv10n (быстро)", "yolov10n.pt"),
+    ("YOLOv10s (баланс)", "yolov10s.pt"),
+    ("YOLOv10m (точно)", "yolov10m.pt"),
+    ("YOLOv8n (быстро)", "yolov8n.pt"),
+    ("YOLOv8s (баланс)", "yolov8s.pt"),
+    ("YOLOv8m (точно)", "yolov8m.pt")
+])
+DEFAULT_MODEL = "YOLO11n (быстро)"
+
+# Бэкенды инференса: PyTorch и экспортированные модели для CPU
+BACKENDS = ("torch", "onnx", "openvino", "int8")
+EXPORT_SUFFIXES = {"onnx": ".onnx", "openvino": "_openvino_model", "int8": "_int8.onnx"}
+
+
+def exported_path(weights, backend):
+    """Путь к экспортированной модели рядом с .pt: yolo11n.onnx, yolo11n_openvino_model/."""
+    return os.path.splitext(weights)[0] + EXPORT_SUFFIXES[backend]
+
+
+def load_model(weights, backend="torch", imgsz=640):
+    """
+    Загружает модель для выбранного бэкенда.
+    Для ONNX Runtime и OpenVINO веса один раз экспортируются рядом с .pt
+    (с динамическим размером входа, чтобы работали пачки кадров), а дальше
+    берутся из кэша, пока .pt не изменится. "int8" — та же ONNX-модель после
+    статической квантизации (см. quantization.py). Выход модели (Results с boxes)
+    одинаков для всех бэкендов.
+
+    Args:
+        weights: Файл весов .pt
+        backend: "torch", "onnx", "openvino" или "int8"
+        imgsz: Размер входа при экспорте
+
+    Returns:
+        YOLO: Загруженная модель
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {backend}")
+    if backend == "torch":
+        return YOLO(weights)
+
+    path = exported_path(weights, backend)
+    stale = os.path.exists(weights) and os.path.exists(path) and os.path.getmtime(path) < os.path.getmtime(weights)
+    if not os.path.exists(path) or stale:
+        if backend == "int8":
+            # Квантизация калибруется на кадрах из Images/ и photo/
+            from quantization import CALIBRATION_DIRS, quantize_model, read_calibration_frames
+            path = quantize_model(weights, read_calibration_frames(CALIBRATION_DIRS), imgsz)
+        else:
+            path = YOLO(weights).export(format=backend, imgsz=imgsz, dynamic=True)
+
+    return YOLO(path, task="detect")
+
+
+def file_size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names) / 2**20
+    return os.path.getsize(path) / 2**20 if os.path.exists(path) else 0.0
+
+
+def estimate_size_mb(model, path):
+    """Оценивает объём модели в памяти по числу параметров (FP32), иначе по размеру файла."""
+    try:
+        params = sum(p.numel() for p in model.model.parameters())
+        return params * 4 / 2**20
+    except AttributeError:
+        return file_size_mb(path)
+
+
+class ModelRegistry:
+    """
+    Пул загруженных моделей с вытеснением давно не использованных (LRU).
+
+    Каждая модель загружается с диска один раз при первом обращении и сразу
+    прогревается пустым кадром, поэтому повторное переключение на неё занимает
+    миллисекунды. Если суммарный объём моделей превышает memory_budget_mb,
+    вытесняются самые давно использованные (последняя остаётся всегда).
+    """
+
+    def __init__(self, models=MODELS, memory_budget_mb=512, warmup_size=640, backend="torch"):
+        self.models = OrderedDict(models)
+        self.memory_budget_mb = memory_budget_mb
+        self.warmup_size = warmup_size
+        self.backend = backend
+
+        self.pool = OrderedDict()  # (подпись, бэкенд) -> (модель, объём в МБ)
+        self.loading = {}  # (подпись, бэкенд) -> threading.Event загрузки, идущей сейчас
+        self.lock = threading.Lock()
+
+    def labels(self):
+        return list(self.models)
+
+    def path(self, label):
+        if label not in self.models:
+            raise KeyError(f"Неизвестная модель: {label}")
+        return self.models[label]
+
+    def is_loaded(self, label, backend=None):
+        with self.lock:
+            return (label, backend or self.backend) in self.pool
+
+    def warmup(self, model):
+        dummy = np.zeros((self.warmup_size, self.warmup_size, 3), dtype=np.uint8)
+        model(dummy, verbose=False)
+
+    def load(self, label, backend=None):
+        """Загружает модель с диска и прогревает её (без пула)."""
+        backend = backend or self.backend
+        path = self.path(label)
+        model = load_model(path, backend, self.warmup_size)
+        self.warmup(model)
+        size_path = path if backend == "torch" else exported_path(path, backend)
+        return model, estimate_size_mb(model, size_path)
+
+    def get(self, label, backend=None):
+        """
+        Возвращает модель из пула, при необходимости загружая её.
+
+        Блокировка держится только на время работы с пулом: загрузка и прогрев
+        идут без неё, поэтому is_loaded и get уже загруженных моделей не ждут
+        чужой загрузки. Одновременные запросы одной модели ждут одну загрузку.
+        """
+        key = (label, backend or self.backend)
+        while True:
+            with self.lock:
+                if key in self.pool:
+                    self.pool.move_to_end(key)
+                    return self.pool[key][0]
+                loading = self.loading.get(key)
+                if loading is None:
+                    loading = self.loading[key] = threading.Event()
+                    break
+            # Модель уже грузится в другом потоке: ждём и проверяем пул снова
+            loading.wait()
+
+        try:
+            model, size_mb = self.load(*key)
+            with self.lock:
+                self.pool[key] = (model, size_mb)
+                self._evict()
+            return model
+        finally:
+            with self.lock:
+                del self.loading[key]
+            loading.set()
+
+    def _evict(self):
+        while len(self.pool) > 1 and sum(size for _, size in self.pool.values()) > self.memory_budget_mb:
+            self.pool.popitem(last=False)
@@ -2,40 +2,45 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from PIL import Image, ImageTk
 import cv2
-from ultralytics import YOLO
-import time
+from functools import partial
 from roundButton import create_rounded_button
-from Detected import detect_traffic_light_state
+from inferenceWorker import InferenceWorker
+from metrics import METRICS
+from modelRegistry import BACKENDS, DEFAULT_MODEL, ModelRegistry
+from Detected import classify_traffic_lights
 
 model = None
 image = None
 detected_image = None
 original_cv2 = None
+original_rgb = None  # Та же картинка в RGB для PIL и разметки
+detected_boxes = []  # Рамки светофоров последней детекции, для сохранения результата
 
-def load_model(model_path="yolov10n.pt"):
+def load_model(label=DEFAULT_MODEL, backend=None):
+    if registry.is_loaded(label, backend):
+        status_label.config(text=f"Переключаемся на {label}...", fg="#b993d6")
+    else:
+        status_label.config(text=f"Загружаем {label}...", fg="#b993d6")
+    worker.submit("model", partial(registry.get, label, backend),
+                  partial(on_model_loaded, label), partial(on_model_error, label))
+
+
+def on_model_loaded(label, loaded_model):
     global model, current_model_name
-    try:
-        status_label.config(text=f"Загружаем {model_path}...", fg="#b993d6")
-        root.update()
-        model = YOLO(model_path)
-        current_model_name = model_path
-        status_label.config(text=f"Модель {model_path} загружена", fg="lightgreen")
-    except Exception as e:
-        status_label.config(text=f"Ошибка загрузки {model_path}", fg="#ff6b6b")
-        print(f"Ошибка: {e}")
+    model = loaded_model
+    current_model_name = label
+    status_label.config(text=f"Модель {label} загружена", fg="lightgreen")
+
+
+def on_model_error(label, e):
+    status_label.config(text=f"Ошибка загрузки {label}", fg="#ff6b6b")
+    print(f"Ошибка: {e}")
 
 def switch_model(event=None):
-    selected = model_selector.get()
-    model_map = {
-        "YOLOv10n (быстро)": "yolov10n.pt",
-        "YOLOv10s (баланс)": "yolov10s.pt",
-        "YOLOv10m (точно)": "yolov10m.pt"
-    }
-    if selected in model_map:
-        load_model(model_map[selected])
+    load_model(model_selector.get(), backend_selector.get())
 
 def open_image():
-    global image, original_cv2, detected_image
+    global image, original_cv2, original_rgb, detected_image, detected_boxes
 
     filepath = filedialog.askopenfilename(
         title="Выберите изображение",
@@ -52,9 +57,12 @@ def open_image():
         img_rgb = cv2.cvtColor(img_cv2, cv2.COLOR_BGR2RGB)
         pil_img = Image.fromarray(img_rgb)
 
-        image = pil_img.copy()
-        original_cv2 = img_cv2.copy()
+        image = pil_img
+        original_cv2 = img_cv2
+        original_rgb = img_rgb
         detected_image = None
+        detected_boxes = []
+        worker.cancel("detect")
 
         show_image(pil_img, canvas_before)
         clear_canvas(canvas_after)
@@ -65,8 +73,6 @@ def open_image():
 
 
 def detect_red_traffic_light():
-    global image, detected_image, original_cv2
-
     if original_cv2 is None:
         messagebox.showwarning("Внимание", "Сначала загрузите изображение!")
         return
@@ -75,40 +81,61 @@ def detect_red_traffic_light():
         messagebox.showwarning("Внимание", "Модель ещё не загружена!")
         return
 
-    try:
-        start_time = time.time()
-        results = model(original_cv2, classes=[9], verbose=False)  # только светофоры
-        elapsed_time = time.time() - start_time
+    status_label.config(text="Выполняется детекция...", fg="#b993d6")
+    worker.submit("detect", partial(find_red_lights, model, original_cv2, original_rgb),
+                  show_red_lights_result, show_detection_error)
 
-        annotated_cv2 = original_cv2.copy()
-        red_lights = 0
 
-        boxes = results[0].boxes
-        for box in boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
-            roi = original_cv2[y1:y2, x1:x2]
+def find_red_lights(model, original_cv2, original_rgb):
+    """Выполняется в фоновом потоке: детекция и разметка без обращения к окну."""
+    timings = METRICS.frame()
+    METRICS.inc("frames")
+
+    with timings.stage("inference"):
+        results = model(original_cv2, classes=[9], verbose=False)  # только светофоры
 
-            if detect_traffic_light_state(roi) == "red":
-                cv2.rectangle(annotated_cv2, (x1, y1), (x2, y2), (0, 0, 255), 3)  # красная рамка
-                cv2.putText(annotated_cv2, "RED", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    annotated_rgb = original_rgb.copy()  # рисуем сразу в RGB, без перевода результата
+    red_lights = 0
+
+    boxes = [tuple(map(int, box.xyxy[0])) for box in results[0].boxes]
+    with timings.stage("classify"):
+        states = classify_traffic_lights(original_cv2, boxes)
+    METRICS.inc("traffic_lights_found", len(boxes))
+    METRICS.inc("traffic_lights_classified", len(boxes))
+
+    with timings.stage("render"):
+        for (x1, y1, x2, y2), state in zip(boxes, states):
+            if state == "red":
+                cv2.rectangle(annotated_rgb, (x1, y1), (x2, y2), (255, 0, 0), 3)  # красная рамка
+                cv2.putText(annotated_rgb, "RED", (x1, y1 - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
                 red_lights += 1
 
-        annotated_rgb = cv2.cvtColor(annotated_cv2, cv2.COLOR_BGR2RGB)
+    with timings.stage("convert"):
         pil_result = Image.fromarray(annotated_rgb)
-        detected_image = pil_result.copy()
-        show_image(pil_result, canvas_after)
 
-        if red_lights == 0:
-            status_label.config(text="Красных светофоров не найдено", fg="#ffb347")
-        else:
-            status_label.config(text=f"Найдено красных светофоров: {red_lights}", fg="lightgreen")
+    return {'image': pil_result, 'boxes': boxes, 'red_lights': red_lights, 'timings': timings}
 
-        print(f"Детекция за {elapsed_time:.3f} секунд")
 
-    except Exception as e:
-        print(f"Ошибка детекции: {e}")
-        messagebox.showerror("Ошибка", "Не удалось выполнить детекцию")
+def show_red_lights_result(result):
+    global detected_image, detected_boxes
+
+    detected_image = result['image'].copy()
+    detected_boxes = result['boxes']
+    show_image(result['image'], canvas_after)
+
+    if result['red_lights'] == 0:
+        status_label.config(text="Красных светофоров не найдено", fg="#ffb347")
+    else:
+        status_label.config(text=f"Найдено красных светофоров: {result['red_lights']}", fg="lightgreen")
+
+    print(f"Детекция: {result['timings']}")
+
+
+def show_detection_error(e):
+    print(f"Ошибка детекции: {e}")
+    status_label.config(text="Ошибка детекции", fg="#ff6b6b")
+    messagebox.showerror("Ошибка", "Не удалось выполнить детекцию")
 
 
 
@@ -123,8 +150,9 @@ def show_image(pil_image, canvas):
     new_w = int(img_w * ratio)
     new_h = int(img_h * ratio)
 
-    resized = pil_image.resize((new_w, new_h), Image.LANCZOS)
-    photo = ImageTk.PhotoImage(resized)
+    with METRICS.timer("display"):
+        resized = pil_image.resize((new_w, new_h), Image.LANCZOS)
+        photo = ImageTk.PhotoImage(resized)
 
     canvas.delete("all")
     canvas.create_image(canvas_w // 2, canvas_h // 2, image=photo, anchor="center")
@@ -151,10 +179,9 @@ def save_result():
         return
 
     try:
-        results = model(original_cv2, classes=[9], verbose=False)
+        # Рамки берутся из последней детекции, модель повторно не запускается
         annotated = original_cv2.copy()
-        for box in results[0].boxes:
-            x1, y1, x2, y2 = map(int, box.xyxy[0])
+        for x1, y1, x2, y2 in detected_boxes:
             cv2.rectangle(annotated, (x1, y1), (x2, y2), (0, 250, 0), 3)
 
         is_saved = cv2.imwrite(filepath, annotated)
@@ -167,14 +194,7 @@ def save_result():
     except:
         messagebox.showerror("Ошибка", "Не удалось сохранить файл")
 
-def preprocess_image(img_cv2, kernel_size=3):
-    if kernel_size % 2 == 0:
-        raise ValueError("Размер ядра должен быть нечётным числом")
-
-    img_rgb = cv2.cvtColor(img_cv2, cv2.COLOR_BGR2RGB)
-    img_denoised = cv2.medianBlur(img_rgb, kernel_size)
-
-    return img_denoised
+registry = ModelRegistry()
 
 root = tk.Tk()
 root.title("Обнаружение светофоров")
@@ -201,15 +221,32 @@ model_label.pack(side="left", padx=(0, 5))
 
 model_selector = ttk.Combobox(
     top_frame,
-    values=["YOLOv8n (быстро)", "YOLOv8s (баланс)", "YOLOv8m (точно)"],
+    values=registry.labels(),
     state="readonly",
     width=18,
     font=("Segoe UI", 10)
 )
-model_selector.set("YOLOv8n (быстро)")
+model_selector.set(DEFAULT_MODEL)
 model_selector.pack(side="left", padx=(0, 15))
 model_selector.bind("<<ComboboxSelected>>", switch_model)
 
+backend_label = tk.Label(
+    top_frame, text="Бэкенд:",
+    bg=BG_COLOR, fg="#cccccc", font=("Segoe UI", 10)
+)
+backend_label.pack(side="left", padx=(0, 5))
+
+backend_selector = ttk.Combobox(
+    top_frame,
+    values=BACKENDS,
+    state="readonly",
+    width=9,
+    font=("Segoe UI", 10)
+)
+backend_selector.set(registry.backend)
+backend_selector.pack(side="left", padx=(0, 15))
+backend_selector.bind("<<ComboboxSelected>>", switch_model)
+
 # Стилизация Combobox под тёмную тему
 style = ttk.Style()
 style.theme_use('clam')  # используем современную тему
@@ -269,5 +306,6 @@ right_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
 canvas_after = tk.Canvas(right_frame, bg="#2d2d3a", highlightthickness=0)
 canvas_after.pack(fill="both", expand=True, padx=5, pady=5)
 
-root.after(100, lambda: load_model("yolov10m.pt"))
+worker = InferenceWorker(root)
+root.after(100, load_model)
 root.mainloop()
\ No newline at end of file
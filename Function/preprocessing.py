@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+DENOISE_FILTERS = ("median", "box", "bilateral", "none")
+
+# Уменьшение кадра до фильтрации (target_size=640) делает медианный фильтр
+# на 4K в десятки раз дешевле, но меняет кадр, который видит модель: фильтр
+# применяется до уменьшения, а не после. Пока это не сверено по точности
+# на Images/, по умолчанию кадр фильтруется в полном разрешении
+DEFAULT_DENOISE = "median"
+DEFAULT_TARGET_SIZE = None
+
+
+def denoise_image(img, denoise="median", kernel_size=3, dst=None):
+    """
+    Подавляет шум выбранным фильтром.
+
+    Args:
+        img: Изображение
+        denoise: "median", "box", "bilateral" или "none"
+        kernel_size: Размер ядра (нечётный)
+        dst: Необязательный буфер результата того же размера
+
+    Returns:
+        numpy.ndarray: Отфильтрованное изображение (для "none" — исходное)
+    """
+    if denoise == "median":
+        return cv2.medianBlur(img, kernel_size, dst=dst)
+    if denoise == "box":
+        return cv2.blur(img, (kernel_size, kernel_size), dst=dst)
+    if denoise == "bilateral":
+        return cv2.bilateralFilter(img, kernel_size, 50, 50, dst=dst)
+    if denoise == "none":
+        return img
+    raise ValueError(f"Неизвестный фильтр: {denoise}")
+
+
+class Preprocessor:
+    """
+    Настраиваемая предобработка кадра перед моделью: уменьшение до target_size
+    (если задан), затем фильтр шума. Кадр остаётся в BGR, как ждёт ultralytics.
+
+    При уменьшении рамки модели приходят в координатах уменьшенного кадра;
+    их нужно разделить на возвращаемый масштаб (см. split_detections).
+
+    Для потока кадров можно передавать slot: промежуточные и выходной массивы
+    для каждого слота выделяются один раз и переиспользуются, поэтому
+    результат действителен только до следующего вызова с тем же слотом.
+
+    Args:
+        kernel_size: Размер ядра фильтра (нечётный)
+        denoise: "median", "box", "bilateral" или "none"
+        target_size: Длинная сторона после уменьшения (None — без уменьшения)
+    """
+
+    def __init__(self, kernel_size=3, denoise=DEFAULT_DENOISE, target_size=DEFAULT_TARGET_SIZE):
+        if kernel_size % 2 == 0:
+            raise ValueError("Размер ядра должен быть нечётным числом")
+        if denoise not in DENOISE_FILTERS:
+            raise ValueError(f"Неизвестный фильтр: {denoise}")
+
+        self.kernel_size = kernel_size
+        self.denoise = denoise
+        self.target_size = target_size
+        self.buffers = {}  # (слот, стадия) -> массив
+
+    def _buffer(self, slot, stage, shape):
+        if slot is None:
+            return None
+        buffer = self.buffers.get((slot, stage))
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.buffers[(slot, stage)] = buffer
+        return buffer
+
+    def __call__(self, img_cv2, slot=None):
+        """
+        Returns:
+            tuple: (изображение для модели, масштаб относительно исходного кадра)
+        """
+        h, w = img_cv2.shape[:2]
+        scale = 1.0
+        if self.target_size and max(h, w) > self.target_size:
+            scale = self.target_size / max(h, w)
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            resized = self._buffer(slot, "resized", (size[1], size[0], 3))
+            # INTER_LINEAR, как в letterbox ultralytics: модель получает тот же кадр, что и без уменьшения
+            img_cv2 = cv2.resize(img_cv2, size, dst=resized, interpolation=cv2.INTER_LINEAR)
+
+        img_denoised = denoise_image(img_cv2, self.denoise, self.kernel_size,
+                                     dst=self._buffer(slot, "denoised", img_cv2.shape))
+
+        return img_denoised, scale
@@ -0,0 +1,175 @@
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import cv2
+import numpy as np
+
+from cameraConfig import CameraConfig
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, analyze_frame, split_detections
+from metrics import METRICS
+from preprocessing import DEFAULT_DENOISE, DEFAULT_TARGET_SIZE, Preprocessor
+
+# Состояние процесса-воркера: модель, предобработка и подключённые блоки общей памяти
+_worker = {}
+
+
+def _init_worker(weights, backend, threads, kernel_size, denoise, target_size, stop_line_points, classes):
+    import torch
+
+    from modelRegistry import load_model
+
+    # Каждый воркер занимает threads ядер, иначе torch и OpenCV в каждом
+    # процессе запускают по потоку на ядро и процессы мешают друг другу
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+    _worker['model'] = load_model(weights, backend)
+    _worker['preprocessor'] = Preprocessor(kernel_size, denoise, target_size)
+    _worker['blocks'] = {}
+    _worker['stop_line_points'] = stop_line_points
+    _worker['classes'] = list(classes)
+
+
+def _frame(name, shape, dtype):
+    block = _worker['blocks'].get(name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        _worker['blocks'][name] = block
+    return np.ndarray(shape, dtype, buffer=block.buf)
+
+
+def _detect(name, shape, dtype):
+    """Задача воркера: предобработка -> модель -> Detected, как в интерфейсе."""
+    frame = _frame(name, shape, dtype)
+    timings = {}
+
+    start_time = time.perf_counter()
+    img_preprocessed, scale = _worker['preprocessor'](frame, slot=0)
+    timings['preprocess'] = (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    results = _worker['model'](img_preprocessed, classes=_worker['classes'], verbose=False)
+    timings['inference'] = (time.perf_counter() - start_time) * 1000
+
+    car_boxes, traffic_light_boxes = split_detections(results[0], scale)
+    stop_line_points = _worker['stop_line_points']
+    if stop_line_points is None:
+        return (car_boxes, traffic_light_boxes), timings
+
+    start_time = time.perf_counter()
+    if isinstance(stop_line_points, CameraConfig):
+        analysis = stop_line_points.analyze(frame, car_boxes, traffic_light_boxes)
+    else:
+        analysis = analyze_frame(frame, car_boxes, traffic_light_boxes, stop_line_points)
+    timings['postprocess'] = (time.perf_counter() - start_time) * 1000
+    return analysis, timings
+
+
+class InferencePool:
+    """
+    Пул процессов для детекции на многоядерных машинах.
+
+    Каждый воркер загружает модель один раз при старте и ограничивает torch
+    и OpenCV threads потоками. Кадры передаются воркерам через общую память
+    (multiprocessing.shared_memory), а не сериализацией массивов: у пула
+    max_pending блоков, каждый занят одним кадром до получения результата.
+    Обратно приходят только рамки или результат analyze_frame.
+
+    Длительности стадий из воркеров попадают в METRICS основного процесса.
+
+    Стоп-линия (или CameraConfig) передаётся воркерам один раз при старте,
+    а не с каждым кадром.
+
+    Args:
+        weights: Веса модели
+        backend: Бэкенд инференса (см. modelRegistry.BACKENDS)
+        workers: Количество процессов (по умолчанию ядра / threads)
+        threads: Потоков torch и OpenCV на воркер
+        max_pending: Кадров в обработке одновременно (по умолчанию 2 на воркер)
+        stop_line_points: Стоп-линия или CameraConfig; если задана, воркер сразу
+            вызывает analyze_frame
+        classes: Классы для модели (по умолчанию машины и светофоры; только машины,
+            если светофоры берутся из калибровки)
+    """
+
+    def __init__(self, weights, backend="torch", workers=None, threads=1, kernel_size=3,
+                 denoise=DEFAULT_DENOISE, target_size=DEFAULT_TARGET_SIZE, max_pending=None,
+                 stop_line_points=None, classes=(CAR_CLASS, TRAFFIC_LIGHT_CLASS)):
+        self.workers = workers or max(1, (os.cpu_count() or 1) // threads)
+        self.max_pending = max_pending or self.workers * 2
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"), initializer=_init_worker,
+                                            initargs=(weights, backend, threads, kernel_size, denoise, target_size,
+                                                      stop_line_points, classes))
+
+        self.blocks = [None] * self.max_pending
+        self.free = queue.Queue()
+        for slot in range(self.max_pending):
+            self.free.put(slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _block(self, slot, nbytes):
+        block = self.blocks[slot]
+        if block is None or block.size < nbytes:
+            if block is not None:
+                block.close()
+                block.unlink()
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.blocks[slot] = block
+        return block
+
+    def _release(self, slot, future):
+        if not future.cancelled() and future.exception() is None:
+            for stage, elapsed_ms in future.result()[1].items():
+                METRICS.observe(stage, elapsed_ms)
+        self.free.put(slot)
+
+    def submit(self, frame):
+        """
+        Копирует кадр в свободный блок общей памяти и отдаёт его воркеру.
+        Если все блоки заняты, ждёт освобождения одного из них.
+
+        Args:
+            frame: Кадр в BGR
+
+        Returns:
+            Future: result() — ((car_boxes, traffic_light_boxes) или результат analyze_frame, длительности стадий)
+        """
+        slot = self.free.get()
+        block = self._block(slot, frame.nbytes)
+        np.ndarray(frame.shape, frame.dtype, buffer=block.buf)[...] = frame
+
+        future = self.executor.submit(_detect, block.name, frame.shape, frame.dtype.str)
+        future.add_done_callback(lambda done: self._release(slot, done))
+        return future
+
+    def map(self, frames):
+        """
+        Обрабатывает кадры параллельно и отдаёт результаты в порядке кадров.
+
+        Yields:
+            (car_boxes, traffic_light_boxes) или результат analyze_frame для каждого кадра
+        """
+        pending = deque()
+        for frame in frames:
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().result()[0]
+            pending.append(self.submit(frame))
+        while pending:
+            yield pending.popleft().result()[0]
+
+    def close(self):
+        self.executor.shutdown()
+        for block in self.blocks:
+            if block is not None:
+                block.close()
+                block.unlink()
+        self.blocks = [None] * self.max_pending
@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+from batchDetect import list_images
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, box_iou, split_detections
+from modelRegistry import exported_path, file_size_mb, load_model
+
+CALIBRATION_DIRS = ("../Images", "../photo")
+SCORE_TOLERANCE = 0.05  # Допустимое расхождение оценок классов INT8 и FP32
+
+
+def letterbox(img_cv2, size=640):
+    """
+    Готовит кадр так же, как ultralytics перед ONNX-моделью: вписывает в квадрат
+    size x size с серыми полями, BGR -> RGB, NCHW float32 в диапазоне [0, 1].
+    """
+    h, w = img_cv2.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(img_cv2, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+    return np.ascontiguousarray(tensor[None], dtype=np.float32) / 255.0
+
+
+def read_calibration_frames(directories, limit=None):
+    """Собирает кадры для калибровки из нескольких папок."""
+    paths = []
+    for directory in directories:
+        paths.extend(list_images(directory))
+    if limit:
+        paths = paths[:limit]
+
+    frames = [cv2.imread(path) for path in paths]
+    return [frame for frame in frames if frame is not None]
+
+
+class FrameReader(CalibrationDataReader):
+    """Отдаёт кадры калибровки ONNX Runtime по одному."""
+
+    def __init__(self, onnx_path, frames, size=640):
+        input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+        self.inputs = iter([{input_name: letterbox(frame, size)} for frame in frames])
+
+    def get_next(self):
+        return next(self.inputs, None)
+
+
+def detect_head_nodes(onnx_path):
+    """
+    Узлы головы Detect (последний модуль /model.N/), которые нельзя квантизовать:
+    всё, кроме свёрток ветвей, и DFL. Её выход output0 склеивает координаты
+    рамок (0–640) с оценками классов (0–1), и общая шкала UInt8 на этом
+    тензоре обнуляет все оценки.
+    """
+    nodes = onnx.load(onnx_path).graph.node
+    modules = {node.name.split("/")[1] for node in nodes if node.name.startswith("/model.")}
+    head = "/" + max(modules, key=lambda name: int(name.split(".")[1])) + "/"
+    return [node.name for node in nodes
+            if node.name.startswith(head) and (node.op_type != "Conv" or "/dfl/" in node.name)]
+
+
+def score_error(fp32_path, int8_path, frame, imgsz=640):
+    """Наибольшее расхождение оценок классов INT8 и FP32 на одном кадре."""
+    outputs = []
+    for path in (fp32_path, int8_path):
+        session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        outputs.append(session.run(None, {session.get_inputs()[0].name: letterbox(frame, imgsz)})[0])
+    # output0: (1, 4 + классы, якоря) — первые 4 строки координаты, дальше оценки классов
+    return float(np.abs(outputs[0][:, 4:] - outputs[1][:, 4:]).max())
+
+
+def quantize_model(weights, frames, imgsz=640):
+    """
+    Строит INT8-версию модели статической квантизацией ONNX Runtime.
+    Диапазоны активаций считаются на переданных кадрах, поэтому они должны
+    быть похожи на рабочие (та же камера, то же освещение).
+
+    Args:
+        weights: Файл весов .pt
+        frames: Кадры для калибровки (BGR)
+        imgsz: Размер входа модели
+
+    Returns:
+        str: Путь к INT8-модели (рядом с .pt, суффикс _int8.onnx)
+    """
+    if not frames:
+        raise ValueError("Нет кадров для калибровки")
+
+    load_model(weights, "onnx", imgsz)  # экспорт FP32 ONNX, если его ещё нет
+    fp32_path = exported_path(weights, "onnx")
+    int8_path = exported_path(weights, "int8")
+
+    quantize_static(fp32_path, int8_path, FrameReader(fp32_path, frames, imgsz),
+                    quant_format=QuantFormat.QDQ, per_channel=True,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    nodes_to_exclude=detect_head_nodes(fp32_path))
+
+    error = score_error(fp32_path, int8_path, frames[0], imgsz)
+    if error > SCORE_TOLERANCE:
+        os.remove(int8_path)  # иначе load_model возьмёт негодную модель из кэша
+        raise ValueError(f"Оценки классов INT8 расходятся с FP32 на {error:.3f} (допустимо {SCORE_TOLERANCE})")
+    return int8_path
+
+
+def match_detections(reference, candidate, min_iou=0.5):
+    """
+    Жадно сопоставляет рамки двух моделей по IoU.
+
+    Returns:
+        list: IoU найденных пар
+    """
+    if not reference or not candidate:
+        return []
+
+    iou = box_iou(reference, candidate)
+    matched = []
+    while iou.size and iou.max() >= min_iou:
+        r, c = np.unravel_index(iou.argmax(), iou.shape)
+        matched.append(float(iou[r, c]))
+        iou[r, :] = 0
+        iou[:, c] = 0
+    return matched
+
+
+def compare_models(reference_model, candidate_model, frames, min_iou=0.5):
+    """
+    Сравнивает детекции машин и светофоров двух моделей на одних кадрах.
+    Эталоном считается reference_model (FP32): разметки у кадров нет, поэтому
+    точность INT8 оценивается как совпадение с исходной моделью.
+
+    Returns:
+        dict: Для каждого класса — число рамок у обеих моделей, recall и precision
+              относительно эталона и средний IoU совпавших рамок; среднее время кадра
+    """
+    counts = {name: {'reference': 0, 'candidate': 0, 'ious': []} for name in ("cars", "traffic_lights")}
+    latency = {'reference': [], 'candidate': []}
+
+    for frame in frames:
+        detections = {}
+        for key, model in (('reference', reference_model), ('candidate', candidate_model)):
+            start_time = time.perf_counter()
+            results = model(frame, classes=[CAR_CLASS, TRAFFIC_LIGHT_CLASS], verbose=False)
+            latency[key].append((time.perf_counter() - start_time) * 1000)
+            detections[key] = dict(zip(("cars", "traffic_lights"), split_detections(results[0])))
+
+        for name, stats in counts.items():
+            stats['reference'] += len(detections['reference'][name])
+            stats['candidate'] += len(detections['candidate'][name])
+            stats['ious'].extend(match_detections(detections['reference'][name],
+                                                  detections['candidate'][name], min_iou))
+
+    report = {}
+    for name, stats in counts.items():
+        matched = len(stats['ious'])
+        report[name] = {
+            'reference': stats['reference'],
+            'candidate': stats['candidate'],
+            'matched': matched,
+            'recall': matched / stats['reference'] if stats['reference'] else 1.0,
+            'precision': matched / stats['candidate'] if stats['candidate'] else 1.0,
+            'mean_iou': float(np.mean(stats['ious'])) if stats['ious'] else 0.0
+        }
+    report['latency_ms'] = {key: float(np.mean(values)) for key, values in latency.items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8-квантизация модели и сравнение с FP32")
+    parser.add_argument("--model", default="yolo11n.pt", help="Веса модели")
+    parser.add_argument("--calibration", nargs="+", default=list(CALIBRATION_DIRS),
+                        help="Папки с кадрами для калибровки")
+    parser.add_argument("--limit", type=int, help="Максимум кадров для калибровки")
+    parser.add_argument("--imgsz", type=int, default=640, help="Размер входа модели")
+    parser.add_argument("--output", default="quantization.json", help="Файл отчёта (.json)")
+    args = parser.parse_args()
+
+    frames = read_calibration_frames(args.calibration, args.limit)
+    if not frames:
+        print(f"Кадры для калибровки не найдены: {', '.join(args.calibration)}")
+        return
+
+    int8_path = quantize_model(args.model, frames, args.imgsz)
+    report = compare_models(load_model(args.model, "onnx", args.imgsz), load_model(args.model, "int8", args.imgsz),
+                            frames)
+    report.update({
+        'model': args.model,
+        'frames': len(frames),
+        'score_error': score_error(exported_path(args.model, "onnx"), int8_path, frames[0], args.imgsz),
+        'size_mb': {
+            'fp32': file_size_mb(exported_path(args.model, "onnx")),
+            'int8': file_size_mb(int8_path)
+        }
+    })
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for name in ("cars", "traffic_lights"):
+        stats = report[name]
+        print(f"{name}: FP32 {stats['reference']}, INT8 {stats['candidate']}, "
+              f"recall {stats['recall']:.3f}, precision {stats['precision']:.3f}, IoU {stats['mean_iou']:.3f}")
+    print(f"Время кадра: FP32 {report['latency_ms']['reference']:.1f} мс, "
+          f"INT8 {report['latency_ms']['candidate']:.1f} мс")
+    print(f"Расхождение оценок классов на первом кадре: {report['score_error']:.4f}")
+    print(f"Размер: FP32 {report['size_mb']['fp32']:.1f} МБ, INT8 {report['size_mb']['int8']:.1f} МБ")
+    print(f"Отчёт сохранён в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+import numpy as np
+
+from batchDetect import count_frame
+from cameraConfig import CONFIG_DIR, CameraConfig
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, analyze_frame, split_detections
+from metrics import METRICS
+from modelRegistry import BACKENDS, load_model
+from preprocessing import DEFAULT_DENOISE, DEFAULT_TARGET_SIZE, DENOISE_FILTERS, Preprocessor
+
+MAX_BODY_MB = 32
+
+
+class MicroBatcher:
+    """
+    Собирает одновременные запросы в один пакетный вызов модели.
+
+    Первый запрос пакета ждёт не дольше max_delay_ms, пока подойдут другие;
+    пакет уходит в модель раньше, если набралось max_batch кадров. Модель
+    работает в одном отдельном потоке, и пока она занята, новые запросы
+    копятся в очереди — под нагрузкой пакеты сами становятся крупнее.
+
+    Args:
+        model: Загруженная модель YOLO (одна на все камеры)
+        max_batch: Наибольший размер пакета
+        max_delay_ms: Сколько ждать остальных запросов пакета
+        preprocessor: Настроенный Preprocessor
+    """
+
+    def __init__(self, model, max_batch=16, max_delay_ms=5, preprocessor=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.preprocessor = preprocessor or Preprocessor()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown()
+
+    async def detect(self, img_cv2):
+        """
+        Returns:
+            tuple: (car_boxes, traffic_light_boxes) в координатах присланного кадра
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((img_cv2, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            METRICS.inc("batches")
+            METRICS.inc("batched_frames", len(batch))
+            try:
+                detections = await loop.run_in_executor(self.executor, self._infer, [img for img, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, detections):
+                if not future.done():
+                    future.set_result(result)
+
+    def _infer(self, images):
+        with METRICS.timer("preprocess"):
+            prepared = [self.preprocessor(img, slot=i) for i, img in enumerate(images)]
+        with METRICS.timer("inference"):
+            results = self.model([img for img, _ in prepared], classes=[CAR_CLASS, TRAFFIC_LIGHT_CLASS], verbose=False)
+        return [split_detections(result, scale) for result, (_, scale) in zip(results, prepared)]
+
+
+def parse_stop_line(value):
+    """Стоп-линия из параметра запроса вида "x1,y1,x2,y2"."""
+    try:
+        x1, y1, x2, y2 = (int(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("stop_line должен иметь вид x1,y1,x2,y2")
+    return [(x1, y1), (x2, y2)]
+
+
+class DetectionService:
+    """
+    Локальный HTTP-сервис проверки нарушений стоп-линии.
+
+    POST /analyze — тело запроса: JPEG или PNG; стоп-линия задаётся
+    параметром stop_line=x1,y1,x2,y2 либо camera=<id> (настройка камеры
+    из CONFIG_DIR с несколькими направлениями). Ответ — JSON analyze_frame.
+    GET /metrics — метрики в формате Prometheus, GET /health — проверка.
+    """
+
+    def __init__(self, batcher, stop_line_points=None, config_dir=CONFIG_DIR):
+        self.batcher = batcher
+        self.stop_line_points = stop_line_points  # Линия по умолчанию для запросов без stop_line
+        self.config_dir = config_dir
+        self.cameras = {}  # camera_id -> CameraConfig
+
+    def camera(self, camera_id):
+        # Идентификатор камеры — только имя файла в config_dir: без путей и "..".
+        # В кэш попадают только найденные настройки, поэтому он не растёт от мусорных запросов
+        if not camera_id or ".." in camera_id or "\\" in camera_id or os.path.basename(camera_id) != camera_id:
+            raise ValueError(f"Недопустимый идентификатор камеры: {camera_id}")
+        if camera_id not in self.cameras:
+            try:
+                self.cameras[camera_id] = CameraConfig.load(camera_id, self.config_dir)
+            except FileNotFoundError:
+                raise ValueError(f"Нет настройки камеры: {camera_id}")
+        return self.cameras[camera_id]
+
+    async def analyze(self, query, body):
+        if "camera" in query:
+            stop_lines = self.camera(query["camera"][0])
+        elif "stop_line" in query:
+            stop_lines = parse_stop_line(query["stop_line"][0])
+        elif self.stop_line_points is not None:
+            stop_lines = self.stop_line_points
+        else:
+            raise ValueError("Не задана стоп-линия (stop_line или camera)")
+
+        loop = asyncio.get_running_loop()
+        with METRICS.timer("decode"):
+            img_cv2 = await loop.run_in_executor(None, cv2.imdecode, np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+        if img_cv2 is None:
+            raise ValueError("Невозможно прочитать изображение (ожидается JPEG или PNG)")
+
+        car_boxes, traffic_light_boxes = await self.batcher.detect(img_cv2)
+        with METRICS.timer("postprocess"):
+            if isinstance(stop_lines, CameraConfig):
+                analysis = stop_lines.analyze(img_cv2, car_boxes, traffic_light_boxes)
+            else:
+                analysis = analyze_frame(img_cv2, car_boxes, traffic_light_boxes, stop_lines)
+        count_frame(analysis)
+        return analysis
+
+    async def route(self, method, path, query, body):
+        """
+        Returns:
+            tuple: (код ответа, тело, Content-Type)
+        """
+        if path == "/analyze" and method == "POST":
+            try:
+                analysis = await self.analyze(query, body)
+            except ValueError as e:
+                return HTTPStatus.BAD_REQUEST, json.dumps({'error': str(e)}, ensure_ascii=False), "application/json"
+            return HTTPStatus.OK, json.dumps(analysis, ensure_ascii=False), "application/json"
+        if path == "/metrics" and method == "GET":
+            return HTTPStatus.OK, METRICS.to_prometheus(), "text/plain; version=0.0.4"
+        if path == "/health" and method == "GET":
+            return HTTPStatus.OK, "ok", "text/plain"
+        return HTTPStatus.NOT_FOUND, json.dumps({'error': f"{method} {path}"}), "application/json"
+
+    async def handle(self, reader, writer):
+        """Обслуживает одно соединение; поддерживает keep-alive."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_MB * 2**20:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "", "text/plain", close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                url = urlsplit(target)
+                METRICS.inc("requests")
+                try:
+                    status, text, content_type = await self.route(method, url.path, parse_qs(url.query), body)
+                except Exception as e:
+                    status, text, content_type = HTTPStatus.INTERNAL_SERVER_ERROR, str(e), "text/plain"
+
+                close = headers.get("connection", "").lower() == "close"
+                await self.respond(writer, status, text, content_type, close)
+                if close:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, text, content_type, close=False):
+        body = text.encode("utf-8")
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+async def serve(service, host, port):
+    service.batcher.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Сервис слушает http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-сервис проверки нарушений стоп-линии")
+    parser.add_argument("--host", default="127.0.0.1", help="Адрес")
+    parser.add_argument("--port", type=int, default=8080, help="Порт")
+    parser.add_argument("--model", default="yolo11n.pt", help="Веса модели")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Бэкенд инференса (onnx, openvino и int8 готовятся один раз рядом с .pt)")
+    parser.add_argument("--stop-line", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                        help="Стоп-линия для запросов без stop_line и camera")
+    parser.add_argument("--config-dir", default=CONFIG_DIR, help="Папка настроек камер")
+    parser.add_argument("--max-batch", type=int, default=16, help="Наибольший размер пакета")
+    parser.add_argument("--max-delay-ms", type=float, default=5, help="Сколько ждать запросы для пакета (мс)")
+    parser.add_argument("--kernel-size", type=int, default=3, help="Размер ядра фильтра шума")
+    parser.add_argument("--denoise", choices=DENOISE_FILTERS, default=DEFAULT_DENOISE, help="Фильтр шума")
+    parser.add_argument("--target-size", type=int, default=DEFAULT_TARGET_SIZE,
+                        help="Уменьшать кадр до этой длинной стороны перед фильтром (по умолчанию не уменьшать)")
+    args = parser.parse_args()
+
+    stop_line_points = None
+    if args.stop_line:
+        x1, y1, x2, y2 = args.stop_line
+        stop_line_points = [(x1, y1), (x2, y2)]
+
+    preprocessor = Preprocessor(args.kernel_size, args.denoise, args.target_size or None)
+    batcher = MicroBatcher(load_model(args.model, args.backend), args.max_batch, args.max_delay_ms, preprocessor)
+    service = DetectionService(batcher, stop_line_points, args.config_dir)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
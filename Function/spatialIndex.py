@@ -0,0 +1,238 @@
+import argparse
+import time
+
+import numpy as np
+
+from Detected import line_intersects_box
+from stopLine import StopLine
+
+
+def line_bands(stop_lines, margin=0):
+    """
+    Полосы стоп-линий: рамка отрезка, расширенная на threshold (+ margin).
+    Машина, которую линия пересекает или которая стоит за линией ближе
+    threshold, всегда задевает полосу своей линии.
+
+    Returns:
+        numpy.ndarray: Массив формы (L, 4) в формате x1, y1, x2, y2
+    """
+    bands = []
+    for line in stop_lines:
+        pad = line.threshold + margin
+        bands.append((line.x_range[0] - pad, line.y_range[0] - pad, line.x_range[1] + pad, line.y_range[1] + pad))
+    return np.array(bands, dtype=np.float64).reshape(-1, 4)
+
+
+def segment_distances(points, starts, vectors):
+    """
+    Расстояния от точек до отрезков (начало + направляющий вектор).
+    Массивы согласуются по правилам broadcasting NumPy, последняя ось — (x, y).
+    """
+    offsets = points - starts
+    lengths2 = (vectors ** 2).sum(axis=-1)
+    dot = (offsets * vectors).sum(axis=-1)
+    shape = np.broadcast(dot, lengths2).shape
+    t = np.divide(dot, lengths2, out=np.zeros(shape), where=lengths2 > 0)
+    return np.linalg.norm(offsets - np.clip(t, 0, 1)[..., None] * vectors, axis=-1)
+
+
+def bottom_centers(boxes):
+    """Центры нижних границ рамок, форма (N, 2)."""
+    return np.stack([(boxes[:, 0] + boxes[:, 2]) / 2, boxes[:, 3]], axis=1)
+
+
+class LineBandIndex:
+    """
+    Индекс полос стоп-линий камеры.
+
+    Строится один раз для набора линий. Рамка машины сравнивается с полосами
+    всех линий одной векторной операцией (матрица N x L), и дальше машина
+    проверяется только с линиями, чьи полосы задевает её рамка. Поэтому
+    машину не судят по продолжению чужой далёкой линии (см. CameraConfig),
+    а точная проверка пересечения идёт только для машин рядом с линией.
+    Точная проверка пересечения тоже считается сразу для всех пар
+    (машина, линия) из индекса, без цикла по линиям. Стоп-линий у камеры
+    единицы или десятки, так что сетка ячеек здесь не окупается: обход
+    ячеек в Python дороже матрицы.
+
+    Args:
+        stop_lines: Список StopLine
+        margin: Дополнительное расширение полос
+    """
+
+    def __init__(self, stop_lines, margin=0):
+        self.stop_lines = list(stop_lines)
+        self.bands = line_bands(self.stop_lines, margin)
+        self.starts = np.array([line.point1 for line in self.stop_lines], dtype=np.float64).reshape(-1, 2)
+        self.vectors = np.array([line.point2 for line in self.stop_lines],
+                                dtype=np.float64).reshape(-1, 2) - self.starts
+
+        # Коэффициенты StopLine массивами по линиям, для вертикальных линий k = b = 0 не используются
+        self.vertical = np.array([line.vertical for line in self.stop_lines], dtype=bool)
+        self.below_right = np.array([line.vertical and line.below_right for line in self.stop_lines], dtype=bool)
+        self.k = np.array([0.0 if line.vertical else line.k for line in self.stop_lines], dtype=np.float64)
+        self.b = np.array([0.0 if line.vertical else line.b for line in self.stop_lines], dtype=np.float64)
+        self.ranges = np.array([line.x_range + line.y_range for line in self.stop_lines],
+                               dtype=np.float64).reshape(-1, 4)
+
+    def overlaps(self, boxes):
+        """
+        Какие полосы задевает рамка каждой машины.
+
+        Args:
+            boxes: Массив формы (N, 4) в формате x1, y1, x2, y2
+
+        Returns:
+            numpy.ndarray: Булев массив формы (N, L)
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        b, band = boxes[:, None], self.bands[None]
+        return ((b[..., 0] <= band[..., 2]) & (b[..., 2] >= band[..., 0])
+                & (b[..., 1] <= band[..., 3]) & (b[..., 3] >= band[..., 1]))
+
+    def query(self, boxes):
+        """
+        Пары (машина, линия), у которых рамка машины пересекает полосу линии.
+
+        Returns:
+            tuple: (box_index, line_index) — массивы одинаковой длины
+        """
+        return np.nonzero(self.overlaps(boxes))
+
+    def nearest(self, boxes):
+        """
+        Ближайшая линия для каждой машины среди линий, чьи полосы задевает её рамка.
+
+        Returns:
+            numpy.ndarray: Номера линий формы (N,); -1 для машин вне всех полос
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        mask = self.overlaps(boxes)
+        if len(boxes) == 0 or not mask.any():
+            return np.full(len(boxes), -1, dtype=int)
+
+        distance = segment_distances(bottom_centers(boxes)[:, None], self.starts[None], self.vectors[None])
+        distance[~mask] = np.inf
+        return np.where(mask.any(axis=1), distance.argmin(axis=1), -1)
+
+    def intersecting(self, boxes):
+        """
+        Машины, которые пересекает каждая линия (см. StopLine.intersects_boxes),
+        с проверкой только машин, задевающих полосу линии.
+
+        Returns:
+            list: Для каждой линии — массив номеров пересекаемых ею рамок
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        line_index, box_index = np.nonzero(self.overlaps(boxes).T)  # пары упорядочены по линиям
+        hit = self.pairs_intersect(boxes[box_index], line_index)
+        counts = np.bincount(line_index[hit], minlength=len(self.stop_lines))
+        return np.split(box_index[hit], np.cumsum(counts)[:-1])
+
+    def pairs_intersect(self, boxes, line_index):
+        """
+        StopLine.intersects_boxes для пар: рамка boxes[i] и линия line_index[i].
+
+        Returns:
+            numpy.ndarray: Булев массив формы (P,)
+        """
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+        vertical, below_right = self.vertical[line_index], self.below_right[line_index]
+        k, b, line_x0 = self.k[line_index], self.b[line_index], self.starts[line_index, 0]
+        x_min, x_max, y_min, y_max = self.ranges[line_index].T
+
+        def is_below(px, py):
+            return np.where(vertical, np.where(below_right, px > line_x0, px < line_x0), py > k * px + b)
+
+        # Углы по разные стороны линии — линия пересекает bounding box
+        sides = np.stack([is_below(x1, y1), is_below(x2, y1), is_below(x2, y2), is_below(x1, y2)])
+        intersects = sides.any(axis=0) & ~sides.all(axis=0)
+
+        # Пересечение с левой и правой границами
+        edges = np.zeros_like(intersects)
+        for edge_x in (x1, x2):
+            line_y = k * edge_x + b
+            edges |= ((x_min <= edge_x) & (edge_x <= x_max)
+                      & (((y1 <= line_y) & (line_y <= y2)) | ((y2 <= line_y) & (line_y <= y1))))
+
+        # Пересечение с верхней и нижней границами
+        sloped = k != 0
+        safe_k = np.where(sloped, k, 1.0)
+        for edge_y in (y1, y2):
+            line_x = (edge_y - b) / safe_k
+            edges |= sloped & (y_min <= edge_y) & (edge_y <= y_max) & (x1 <= line_x) & (line_x <= x2)
+
+        return intersects | (edges & ~vertical)
+
+
+def all_pairs_intersecting(boxes, stop_lines):
+    """Перебор всех пар исходным скалярным Detected.line_intersects_box — эталон для сравнения."""
+    result = []
+    for line in stop_lines:
+        result.append(np.array([i for i, box in enumerate(boxes)
+                                if line_intersects_box(line.point1, line.point2, box)], dtype=int))
+    return result
+
+
+def all_lines_intersecting(boxes, stop_lines):
+    """Векторная проверка всех машин каждой линией (StopLine.intersects_boxes) без индекса."""
+    return [np.flatnonzero(line.intersects_boxes(boxes)) for line in stop_lines]
+
+
+def random_scene(box_count, line_count, width=1920, height=1080, seed=0):
+    """Случайные машины и короткие стоп-линии (полосы по 300 пикселей) для замера."""
+    rng = np.random.default_rng(seed)
+    lines = []
+    for _ in range(line_count):
+        x, y = int(rng.integers(0, width - 300)), int(rng.integers(100, height - 100))
+        lines.append(StopLine((x, y), (x + 300, y + int(rng.integers(-30, 30)))))
+
+    x1 = rng.integers(0, width - 200, box_count)
+    y1 = rng.integers(0, height - 150, box_count)
+    boxes = np.stack([x1, y1, x1 + rng.integers(40, 200, box_count), y1 + rng.integers(30, 150, box_count)], axis=1)
+    return boxes, lines
+
+
+def segment_pairs(boxes, line, indices):
+    """Из пересечений прямой оставляет рамки, задевающие рамку отрезка линии."""
+    (x_min, x_max), (y_min, y_max) = line.x_range, line.y_range
+    b = boxes[indices]
+    return indices[(b[:, 0] <= x_max) & (b[:, 2] >= x_min) & (b[:, 1] <= y_max) & (b[:, 3] >= y_min)]
+
+
+def measure(func, repeats):
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start_time) / repeats * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение индекса стоп-линий с перебором всех пар")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 100, 1000], help="Количество машин")
+    parser.add_argument("--lines", type=int, default=12, help="Количество стоп-линий")
+    parser.add_argument("--repeats", type=int, default=20, help="Повторов замера")
+    args = parser.parse_args()
+
+    for box_count in args.boxes:
+        boxes, lines = random_scene(box_count, args.lines)
+        box_list = [tuple(int(v) for v in box) for box in boxes]
+        index = LineBandIndex(lines)
+
+        # Индекс не отбрасывает ни одного пересечения отрезка линии с машиной
+        expected = all_pairs_intersecting(box_list, lines)
+        found = index.intersecting(boxes)
+        lost = sum(len(np.setdiff1d(segment_pairs(boxes, line, e), f))
+                   for line, e, f in zip(lines, expected, found))
+
+        repeats = max(1, args.repeats * 10 // box_count)
+        loop_ms = measure(lambda: all_pairs_intersecting(box_list, lines), repeats)
+        vector_ms = measure(lambda: all_lines_intersecting(boxes, lines), args.repeats)
+        index_ms = measure(lambda: index.intersecting(boxes), args.repeats)
+        print(f"{box_count} машин, {args.lines} линий: перебор {loop_ms:.2f} мс, "
+              f"все линии векторно {vector_ms:.2f} мс, индекс {index_ms:.2f} мс "
+              f"(x{loop_ms / index_ms:.1f} к перебору, x{vector_ms / index_ms:.1f} к векторному); "
+              f"потеряно пересечений отрезков: {lost}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import numpy as np
+
+
+class StopLine:
+    """
+    Стоп-линия камеры с заранее вычисленными коэффициентами.
+
+    Создаётся один раз при настройке камеры: наклон k, сдвиг b, уравнение
+    Ax + By + C = 0 с его нормой и случай вертикальной линии вычисляются в
+    конструкторе, а не при каждой проверке точки. Все запросы принимают как
+    отдельные координаты, так и массивы NumPy.
+
+    Args:
+        point1: Первая точка линии (x1, y1)
+        point2: Вторая точка линии (x2, y2)
+        threshold: Максимальное расстояние в пикселях для "сразу за линией"
+        direction: 1 — машина за линией, если она ниже линии (как в point_below_line),
+                   -1 — если выше (камера смотрит навстречу потоку)
+    """
+
+    def __init__(self, point1, point2, threshold=50, direction=1):
+        if direction not in (1, -1):
+            raise ValueError("Направление движения должно быть 1 или -1")
+
+        self.point1 = tuple(point1)
+        self.point2 = tuple(point2)
+        self.threshold = threshold
+        self.direction = direction
+
+        x1, y1 = self.point1
+        x2, y2 = self.point2
+        self.vertical = x1 == x2
+        self.x_range = (min(x1, x2), max(x1, x2))
+        self.y_range = (min(y1, y2), max(y1, y2))
+
+        if self.vertical:
+            # Для вертикальной линии "ниже" — справа, если линия идет сверху вниз
+            self.k = None
+            self.b = None
+            self.below_right = y2 > y1
+        else:
+            # Уравнение прямой: y = k*x + b
+            self.k = (y2 - y1) / (x2 - x1)
+            self.b = y1 - self.k * x1
+
+        # Уравнение прямой: Ax + By + C = 0 и норма для расстояния
+        self.A = y2 - y1
+        self.B = -(x2 - x1)
+        self.C = (x2 - x1) * y1 - (y2 - y1) * x1
+        self.norm = (self.A**2 + self.B**2)**0.5
+
+    @classmethod
+    def from_points(cls, stop_line_points, threshold=50, direction=1):
+        """Создает стоп-линию из списка [(x1, y1), (x2, y2)]."""
+        point1, point2 = stop_line_points
+        return cls(point1, point2, threshold, direction)
+
+    def region(self, width, height, margin=200):
+        """
+        Полоса кадра вокруг линии, где имеет смысл искать машины: рамка отрезка,
+        расширенная на threshold + margin пикселей и обрезанная по кадру.
+        margin должен быть не меньше высоты машины у линии, иначе рамка машины,
+        чей низ у линии, будет обрезана сверху.
+
+        Returns:
+            tuple: (x1, y1, x2, y2)
+        """
+        pad = self.threshold + margin
+        return (max(0, int(self.x_range[0] - pad)), max(0, int(self.y_range[0] - pad)),
+                min(width, int(self.x_range[1] + pad)), min(height, int(self.y_range[1] + pad)))
+
+    def is_below(self, px, py):
+        """Точка ниже линии (см. point_below_line)."""
+        if self.vertical:
+            return px > self.point1[0] if self.below_right else px < self.point1[0]
+        return py > self.k * px + self.b
+
+    def is_above(self, px, py):
+        """Точка выше линии (см. point_above_line)."""
+        if self.vertical:
+            return px < self.point1[0] if self.below_right else px > self.point1[0]
+        return py < self.k * px + self.b
+
+    def is_past(self, px, py):
+        """Точка за линией с учетом направления движения."""
+        return self.is_below(px, py) if self.direction == 1 else self.is_above(px, py)
+
+    def distance(self, px, py):
+        """Расстояние от точки до прямой в пикселях."""
+        if self.vertical:
+            return abs(px - self.point1[0])
+        return abs(self.A * px + self.B * py + self.C) / self.norm
+
+    def intersects_boxes(self, boxes):
+        """
+        Проверяет, пересекает ли линия bounding box'ы (см. line_intersects_box).
+
+        Args:
+            boxes: Массив формы (N, 4) в формате x1, y1, x2, y2
+
+        Returns:
+            numpy.ndarray: Булев массив формы (N,)
+        """
+        x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+
+        # Углы по разные стороны линии — линия пересекает bounding box
+        sides = np.stack([self.is_below(x1, y1), self.is_below(x2, y1),
+                          self.is_below(x2, y2), self.is_below(x1, y2)])
+        intersects = sides.any(axis=0) & ~sides.all(axis=0)
+
+        if self.vertical:
+            return intersects
+
+        k, b = self.k, self.b
+        (x_min, x_max), (y_min, y_max) = self.x_range, self.y_range
+
+        # Пересечение с левой и правой границами
+        for edge_x in (x1, x2):
+            line_y = k * edge_x + b
+            intersects |= ((x_min <= edge_x) & (edge_x <= x_max)
+                           & (((y1 <= line_y) & (line_y <= y2)) | ((y2 <= line_y) & (line_y <= y1))))
+
+        # Пересечение с верхней и нижней границами
+        if k != 0:
+            for edge_y in (y1, y2):
+                line_x = (edge_y - b) / k
+                intersects |= (y_min <= edge_y) & (edge_y <= y_max) & (x1 <= line_x) & (line_x <= x2)
+
+        return intersects
+
+    def intersects_box(self, box):
+        """
+        Скалярный вариант intersects_boxes для одной рамки (x1, y1, x2, y2)
+        на чистом Python: для единичных рамок он быстрее NumPy.
+        """
+        x1, y1, x2, y2 = box[:4]
+
+        # Углы по разные стороны линии — линия пересекает bounding box
+        sides = {self.is_below(x1, y1), self.is_below(x2, y1), self.is_below(x2, y2), self.is_below(x1, y2)}
+        if len(sides) > 1:
+            return True
+        if self.vertical:
+            return False
+
+        k, b = self.k, self.b
+        (x_min, x_max), (y_min, y_max) = self.x_range, self.y_range
+        for edge_x in (x1, x2):
+            if x_min <= edge_x <= x_max:
+                line_y = k * edge_x + b
+                if y1 <= line_y <= y2 or y2 <= line_y <= y1:
+                    return True
+        if k != 0:
+            for edge_y in (y1, y2):
+                if y_min <= edge_y <= y_max and x1 <= (edge_y - b) / k <= x2:
+                    return True
+        return False
+
+    def evaluate_box(self, box):
+        """
+        Скалярный вариант evaluate_boxes для одной рамки на чистом Python.
+
+        Returns:
+            tuple: (is_over, distance) — distance отрицательное для машины за линией
+        """
+        x1, y1, x2, y2 = box[:4]
+        px, py = (x1 + x2) // 2, y2
+        bottom_past = self.is_past(px, py)
+        distance = float(self.distance(px, py))
+
+        is_over = self.intersects_box(box) or (bottom_past and distance <= self.threshold)
+        return is_over, -distance if is_over and bottom_past else distance
+
+    def evaluate_boxes(self, boxes):
+        """
+        Проверяет все машины относительно линии за один проход.
+
+        Args:
+            boxes: Массив формы (N, 4) в формате x1, y1, x2, y2
+
+        Returns:
+            tuple: (is_over, distance) — массивы формы (N,); distance отрицательное для машин за линией
+        """
+        boxes = np.asarray(boxes)
+        if boxes.size == 0:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+
+        intersects = self.intersects_boxes(boxes)
+
+        # Центр нижней границы машины
+        px = (boxes[:, 0] + boxes[:, 2]) // 2
+        py = boxes[:, 3]
+        bottom_past = self.is_past(px, py)
+        distance = self.distance(px, py).astype(np.float64)
+
+        # Машина за линией, если линия пересекает её или низ машины за линией в пределах threshold
+        is_over = intersects | (bottom_past & (distance <= self.threshold))
+        distance = np.where(is_over & bottom_past, -distance, distance)
+
+        return is_over, distance
@@ -0,0 +1,131 @@
+import numpy as np
+
+from Detected import TRAFFIC_LIGHT_CLASS
+
+
+def tile_grid(width, height, tile_size=640, overlap=0.2, roi=None):
+    """
+    Разбивает кадр (или его область) на перекрывающиеся квадратные плитки.
+
+    Args:
+        width, height: Размер кадра
+        tile_size: Сторона плитки в пикселях исходного кадра
+        overlap: Доля перекрытия соседних плиток
+        roi: Необязательная область (x1, y1, x2, y2), плитки покрывают только её
+
+    Returns:
+        list: Плитки [(x1, y1, x2, y2), ...]
+    """
+    x_min, y_min, x_max, y_max = roi if roi is not None else (0, 0, width, height)
+    x_min, y_min = max(0, int(x_min)), max(0, int(y_min))
+    x_max, y_max = min(width, int(x_max)), min(height, int(y_max))
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(lo, hi):
+        if hi - lo <= tile_size:
+            return [lo]
+        positions = list(range(lo, hi - tile_size, step))
+        positions.append(hi - tile_size)  # последняя плитка прижата к краю
+        return positions
+
+    return [(x, y, min(x + tile_size, x_max), min(y + tile_size, y_max))
+            for y in starts(y_min, y_max) for x in starts(x_min, x_max)]
+
+
+def box_ios(box, boxes):
+    """Доля пересечения относительно меньшей из рамок (обрезанная плиткой рамка почти целиком внутри полной)."""
+    inter_w = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+    inter_h = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+    inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    smaller = np.minimum(area, areas)
+    return np.divide(inter, smaller, out=np.zeros_like(inter), where=smaller > 0)
+
+
+def nms(boxes, scores, classes, threshold=0.5):
+    """
+    Подавление дублей по классам: из пересекающихся рамок одного класса
+    остаётся рамка с наибольшей уверенностью.
+
+    Returns:
+        numpy.ndarray: Индексы оставленных рамок
+    """
+    keep = []
+    for cls in np.unique(classes):
+        order = np.flatnonzero(classes == cls)
+        order = order[np.argsort(-scores[order])]
+        while order.size:
+            best = order[0]
+            keep.append(best)
+            order = order[1:][box_ios(boxes[best], boxes[order[1:]]) <= threshold]
+    return np.array(sorted(keep), dtype=int)
+
+
+class TiledDetector:
+    """
+    Поиск мелких объектов (далёких светофоров) по плиткам кадра в полном
+    разрешении, в духе SAHI.
+
+    Все плитки и уменьшенный целый кадр проходят через модель одним пакетом,
+    затем рамки переводятся в координаты кадра и объединяются NMS. Если задана
+    roi, плитки покрывают только её (например, область светофоров). Сетка
+    плиток считается один раз для каждого размера кадра.
+
+    Args:
+        tile_size: Сторона плитки; модель получает плитку без уменьшения
+        overlap: Доля перекрытия плиток
+        roi: Область (x1, y1, x2, y2) или None — весь кадр
+        nms_threshold: Порог перекрытия (относительно меньшей рамки) для объединения
+        include_full_frame: Добавлять в пакет целый кадр для крупных объектов
+    """
+
+    def __init__(self, tile_size=640, overlap=0.2, roi=None, nms_threshold=0.5, include_full_frame=True):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.roi = roi
+        self.nms_threshold = nms_threshold
+        self.include_full_frame = include_full_frame
+        self.grids = {}  # (ширина, высота) -> плитки
+
+    def tiles(self, frame):
+        h, w = frame.shape[:2]
+        if (w, h) not in self.grids:
+            self.grids[(w, h)] = tile_grid(w, h, self.tile_size, self.overlap, self.roi)
+        return self.grids[(w, h)]
+
+    def detect(self, model, frame, classes=(TRAFFIC_LIGHT_CLASS,), conf=0.25):
+        """
+        Returns:
+            tuple: (boxes (N, 4), scores (N,), classes (N,)) в координатах кадра
+        """
+        tiles = self.tiles(frame)
+        images = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        offsets = [(x1, y1) for x1, y1, _, _ in tiles]
+        if self.include_full_frame:
+            images.append(frame)
+            offsets.append((0, 0))
+
+        results = model(images, classes=list(classes), imgsz=self.tile_size, conf=conf, verbose=False)
+
+        boxes, scores, labels = [], [], []
+        for (dx, dy), result in zip(offsets, results):
+            data = result.boxes.data.cpu().numpy()
+            if len(data) == 0:
+                continue
+            boxes.append(data[:, :4] + (dx, dy, dx, dy))
+            scores.append(data[:, 4])
+            labels.append(data[:, 5].astype(int))
+
+        if not boxes:
+            return np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int)
+
+        boxes, scores, labels = np.concatenate(boxes), np.concatenate(scores), np.concatenate(labels)
+        keep = nms(boxes, scores, labels, self.nms_threshold)
+        return boxes[keep], scores[keep], labels[keep]
+
+    def detect_traffic_lights(self, model, frame, conf=0.25):
+        """Рамки светофоров [(x1, y1, x2, y2), ...] в координатах кадра."""
+        boxes, _, _ = self.detect(model, frame, (TRAFFIC_LIGHT_CLASS,), conf)
+        return [tuple(int(v) for v in box) for box in boxes]
@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+
+from Detected import classify_traffic_lights
+
+
+class TrafficLightTracker:
+    """
+    Отслеживает светофоры между кадрами видео и кэширует их состояние.
+
+    Камера неподвижна, поэтому светофор определяется положением центра рамки,
+    округлённым до сетки grid. Детекцию светофоров нужно повторять раз в
+    refresh_interval кадров или когда средняя яркость зон кэшированной области
+    изменилась больше чем на change_threshold. Цвет переопределяется только для
+    изменившихся светофоров, а новое состояние принимается после confirm_frames
+    одинаковых наблюдений подряд — это сглаживает мерцание "yellow"/"unknown".
+    """
+
+    def __init__(self, refresh_interval=15, change_threshold=12.0, confirm_frames=3, grid=16):
+        self.refresh_interval = refresh_interval
+        self.change_threshold = change_threshold
+        self.confirm_frames = confirm_frames
+        self.grid = grid
+
+        self.lights = {}  # ключ положения -> {'box', 'state', 'candidate', 'count', 'stats'}
+        self.frame_index = 0
+        self.last_detection = None
+        self._stats_cache = (None, {})
+
+    def key_for(self, box):
+        x1, y1, x2, y2 = box
+        return ((x1 + x2) // 2 // self.grid, (y1 + y2) // 2 // self.grid)
+
+    @staticmethod
+    def roi_stats(frame, box):
+        """Средний цвет верхней, средней и нижней зон светофора."""
+        x1, y1, x2, y2 = box
+        roi = frame[y1:y2, x1:x2]
+        if roi.size == 0:
+            return np.zeros(9)
+
+        third = max(roi.shape[0] // 3, 1)
+        zones = (roi[:third], roi[third:2 * third], roi[2 * third:])
+        return np.array([value for zone in zones for value in (cv2.mean(zone)[:3] if zone.size else (0, 0, 0))])
+
+    def _current_stats(self, frame):
+        frame_index, stats = self._stats_cache
+        if frame_index != self.frame_index:
+            stats = {key: self.roi_stats(frame, light['box']) for key, light in self.lights.items()}
+            self._stats_cache = (self.frame_index, stats)
+        return stats
+
+    def _changed(self, key, stats):
+        light = self.lights[key]
+        if light['stats'] is None:
+            return True
+        return np.abs(stats[key] - light['stats']).max() > self.change_threshold
+
+    def needs_detection(self, frame):
+        """Нужно ли на этом кадре заново искать светофоры моделью."""
+        if self.last_detection is None or self.frame_index - self.last_detection >= self.refresh_interval:
+            return True
+
+        stats = self._current_stats(frame)
+        return any(self._changed(key, stats) for key in self.lights)
+
+    def lights_changed(self, frame):
+        """
+        Изменилась ли яркость какого-нибудь светофора с последней классификации.
+        В отличие от needs_detection не трогает кэш кадра, поэтому её можно
+        вызывать из стадии детекции, которая идёт на несколько кадров впереди update.
+        """
+        return any(light['stats'] is None
+                   or np.abs(self.roi_stats(frame, light['box']) - light['stats']).max() > self.change_threshold
+                   for light in list(self.lights.values()))
+
+    def _observe(self, light, state):
+        if light['state'] is None or state == light['state']:
+            light['state'] = state
+            light['candidate'] = None
+            light['count'] = 0
+            return
+
+        if state == light['candidate']:
+            light['count'] += 1
+        else:
+            light['candidate'] = state
+            light['count'] = 1
+
+        if light['count'] >= self.confirm_frames:
+            light['state'] = state
+            light['candidate'] = None
+            light['count'] = 0
+
+    def update(self, frame, boxes=None):
+        """
+        Обновляет светофоры по очередному кадру.
+
+        Args:
+            frame: Кадр в BGR
+            boxes: Свежие рамки светофоров [(x1, y1, x2, y2), ...], если на этом кадре
+                   выполнялась детекция, иначе None — используются сохранённые рамки
+
+        Returns:
+            list: [{'box': (x1, y1, x2, y2), 'state': str}, ...]
+        """
+        detected = boxes is not None
+        if detected:
+            lights = {}
+            for box in boxes:
+                key = self.key_for(box)
+                light = self.lights.get(key) or {'state': None, 'candidate': None, 'count': 0, 'stats': None}
+                light['box'] = tuple(box)
+                lights[key] = light
+            self.lights = lights
+            self.last_detection = self.frame_index
+            self._stats_cache = (None, {})
+
+        stats = self._current_stats(frame)
+        # Переопределяем цвет у новых и изменившихся светофоров, а также пока ждём подтверждения
+        keys = [key for key, light in self.lights.items()
+                if detected or light['candidate'] is not None or self._changed(key, stats)]
+
+        states = classify_traffic_lights(frame, [self.lights[key]['box'] for key in keys])
+        for key, state in zip(keys, states):
+            light = self.lights[key]
+            light['stats'] = stats[key]
+            self._observe(light, state)
+
+        self.frame_index += 1
+        return [{'box': light['box'], 'state': light['state']} for light in self.lights.values()]
@@ -0,0 +1,147 @@
+import numpy as np
+
+from Detected import box_iou
+
+
+class Track:
+    """Одна машина, отслеживаемая между кадрами."""
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+        self.past = None         # Был ли низ машины за линией при последней проверке
+        self.judged = False      # Пересечение уже зафиксировано, машина больше не проверяется
+        self.violation = False
+        self.far = False         # Машина далеко от линии, проверяется реже
+        self.last_check = frame_index
+
+
+class VehicleTracker:
+    """
+    Лёгкий трекер машин в стиле SORT: рамки нового кадра жадно сопоставляются
+    с треками по IoU, а при нулевом IoU — по ближайшему центру.
+
+    Пересечение фиксируется в момент, когда центр нижней границы трека переходит
+    из-под линии за неё; если в этот момент горит красный, это нарушение.
+    Каждый трек оценивается один раз. Треки дальше far_distance пикселей от
+    линии проверяются только раз в far_check_interval кадров.
+
+    Args:
+        stop_line: StopLine камеры
+        min_iou: Минимальный IoU для сопоставления рамки с треком
+        max_center_distance: Максимальный сдвиг центра для сопоставления без пересечения рамок
+        max_missed: Сколько кадров трек живёт без сопоставления
+    """
+
+    def __init__(self, stop_line, min_iou=0.3, max_center_distance=50, max_missed=10,
+                 far_distance=200, far_check_interval=5):
+        self.stop_line = stop_line
+        self.min_iou = min_iou
+        self.max_center_distance = max_center_distance
+        self.max_missed = max_missed
+        self.far_distance = far_distance
+        self.far_check_interval = far_check_interval
+
+        self.tracks = {}
+        self.next_id = 1
+        self.frame_index = 0
+
+    def _match(self, boxes):
+        """Жадное сопоставление треков и рамок. Возвращает {индекс рамки: track_id}."""
+        track_ids = list(self.tracks)
+        if not track_ids or len(boxes) == 0:
+            return {}
+
+        track_boxes = np.array([self.tracks[track_id].box for track_id in track_ids], dtype=np.float64)
+        iou = box_iou(track_boxes, boxes)
+
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        box_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        center_distance = np.linalg.norm(track_centers[:, None] - box_centers[None], axis=2)
+
+        # Сначала по IoU, затем по близости центров
+        score = np.where(iou >= self.min_iou, 1.0 + iou,
+                         np.where(center_distance <= self.max_center_distance,
+                                  1.0 - center_distance / (self.max_center_distance + 1), 0.0))
+
+        matches = {}
+        used_tracks = set()
+        for flat in np.argsort(score, axis=None)[::-1]:
+            t, b = np.unravel_index(flat, score.shape)
+            if score[t, b] <= 0:
+                break
+            if b in matches or t in used_tracks:
+                continue
+            matches[int(b)] = track_ids[t]
+            used_tracks.add(t)
+
+        return matches
+
+    def update(self, car_boxes, traffic_light_state):
+        """
+        Обновляет треки по рамкам машин очередного кадра.
+
+        Args:
+            car_boxes: Список координат машин [(x1, y1, x2, y2), ...]
+            traffic_light_state: Состояние светофора на этом кадре
+
+        Returns:
+            tuple: (track_ids, events) — номер трека для каждой рамки и список пересечений
+                   [{'track_id', 'box', 'frame', 'violation'}, ...], зафиксированных на этом кадре
+        """
+        boxes = np.asarray(car_boxes, dtype=np.float64).reshape(-1, 4)
+        matches = self._match(boxes)
+
+        track_ids = []
+        for i, box in enumerate(car_boxes):
+            track_id = matches.get(i)
+            if track_id is None:
+                track_id = self.next_id
+                self.next_id += 1
+                self.tracks[track_id] = Track(track_id, tuple(box), self.frame_index)
+            else:
+                track = self.tracks[track_id]
+                track.box = tuple(box)
+                track.missed = 0
+            track_ids.append(track_id)
+
+        matched = set(track_ids)
+        for track_id in list(self.tracks):
+            if track_id not in matched:
+                self.tracks[track_id].missed += 1
+                if self.tracks[track_id].missed > self.max_missed:
+                    del self.tracks[track_id]
+
+        events = self._check_crossings([self.tracks[track_id] for track_id in track_ids], traffic_light_state)
+        self.frame_index += 1
+        return track_ids, events
+
+    def _check_crossings(self, tracks, traffic_light_state):
+        candidates = [track for track in tracks if not track.judged
+                      and (not track.far or self.frame_index - track.last_check >= self.far_check_interval)]
+        if not candidates:
+            return []
+
+        boxes = np.array([track.box for track in candidates], dtype=np.float64)
+        px = (boxes[:, 0] + boxes[:, 2]) // 2
+        py = boxes[:, 3]
+        past = self.stop_line.is_past(px, py)
+        distance = self.stop_line.distance(px, py)
+
+        events = []
+        for track, is_past, dist in zip(candidates, past, distance):
+            if track.past is False and is_past:
+                track.judged = True
+                track.violation = traffic_light_state == "red"
+                events.append({
+                    'track_id': track.track_id,
+                    'box': track.box,
+                    'frame': self.frame_index,
+                    'violation': track.violation
+                })
+            track.past = bool(is_past)
+            track.far = dist > self.far_distance
+            track.last_check = self.frame_index
+
+        return events
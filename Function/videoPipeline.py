@@ -0,0 +1,506 @@
+import argparse
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from batchDetect import count_frame
+from cameraCalibration import TrafficLightCalibration
+from cameraConfig import CameraConfig
+from Detected import CAR_CLASS, TRAFFIC_LIGHT_CLASS, analyze_frame, shift_boxes, split_detections
+from metrics import METRICS
+from modelRegistry import BACKENDS, load_model
+from preprocessing import DEFAULT_DENOISE, DEFAULT_TARGET_SIZE, DENOISE_FILTERS, Preprocessor
+from processPool import InferencePool
+from stopLine import StopLine
+from tiledInference import TiledDetector
+from trafficLightTracker import TrafficLightTracker
+from vehicleTracker import VehicleTracker
+
+STOP = object()  # Маркер конца потока кадров
+
+TRAFFIC_LIGHT_COLORS = {
+    "red": (0, 0, 255),
+    "yellow": (0, 255, 255),
+    "green": (0, 255, 0),
+    "unknown": (128, 128, 128)
+}
+
+
+def annotate_frame(frame, analysis, stop_line_points):
+    """
+    Рисует на кадре светофоры, стоп-линию и машины (нарушители — красным).
+    stop_line_points — две точки линии или CameraConfig (рисуются все его линии).
+    """
+    for light in analysis['traffic_lights']:
+        x1, y1, x2, y2 = light['box']
+        color = TRAFFIC_LIGHT_COLORS.get(light['state'], (128, 128, 128))
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+        cv2.putText(frame, f"TRAFFIC LIGHT: {light['state'].upper()}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+
+    lines = stop_line_points.lines if isinstance(stop_line_points, CameraConfig) else [stop_line_points]
+    for point1, point2 in lines:
+        cv2.line(frame, point1, point2, (0, 0, 255), 3)
+        cv2.putText(frame, "STOP LINE", (point1[0], point1[1] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    for car in analysis['cars']:
+        x1, y1, x2, y2 = car['box']
+        if car['violation']:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
+            cv2.putText(frame, "VIOLATION", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        else:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 250, 0), 3)
+
+    return frame
+
+
+class VideoPipeline:
+    """
+    Обработка видео (файл, камера или RTSP-поток) в четыре стадии:
+    чтение кадров -> детекция YOLO -> проверка стоп-линии -> отрисовка и запись.
+
+    Каждая стадия работает в своём потоке, стадии связаны ограниченными очередями,
+    поэтому декодирование и отрисовка идут параллельно с инференсом.
+    """
+
+    def __init__(self, model, source, stop_line_points, output_path=None, queue_size=8, kernel_size=3,
+                 light_tracker=None, calibration=None, vehicle_tracker=None, preprocessor=None, tiler=None,
+                 car_margin=None, pool=None):
+        if pool is not None and ((tiler is not None and calibration is None) or car_margin is not None):
+            raise ValueError("Пул процессов ищет машины и светофоры по целому кадру, без плиток и полосы")
+        if car_margin is not None and calibration is None and light_tracker is None:
+            # Иначе к проходу по полосе на каждом кадре добавляется проход по всему кадру за светофорами
+            raise ValueError("Полоса поиска машин нужна вместе с калибровкой или трекером светофоров")
+
+        self.model = model
+        self.source = source
+        self.stop_line_points = stop_line_points
+        self.output_path = output_path
+        self.kernel_size = kernel_size
+        self.preprocessor = preprocessor or Preprocessor(kernel_size)
+        self.light_tracker = light_tracker
+        self.calibration = calibration
+        # VehicleTracker для одной линии; для CameraConfig — список, по трекеру на направление
+        self.vehicle_tracker = vehicle_tracker
+        self.tiler = tiler  # Светофоры по плиткам в полном разрешении (TiledDetector)
+        self.car_margin = car_margin  # Если задан, машины ищутся только в полосе вокруг стоп-линии
+        # Несколько направлений (CameraConfig) или одна стоп-линия
+        self.camera_config = stop_line_points if isinstance(stop_line_points, CameraConfig) else None
+        self.stop_line = self.camera_config or StopLine.from_points(stop_line_points)
+        if (self.camera_config is not None and vehicle_tracker is not None
+                and (not isinstance(vehicle_tracker, list)
+                     or len(vehicle_tracker) != len(self.camera_config.approaches))):
+            raise ValueError("Нужен отдельный трекер машин для каждого направления")
+        self.regions = {}  # (ширина, высота) -> полоса поиска машин
+        self.pool = pool  # Если задан (InferencePool), детекция идёт в его процессах
+        self.last_light_index = None  # Кадр последнего поиска светофоров моделью
+
+        self.queues = {
+            'decode': queue.Queue(maxsize=queue_size),
+            'infer': queue.Queue(maxsize=queue_size),
+            'postprocess': queue.Queue(maxsize=queue_size)
+        }
+        self.queue_samples = {name: [] for name in self.queues}
+        self.stop_event = threading.Event()
+        self.error = None
+        self.fps = 25.0
+
+        self.frames = 0
+        self.violations = 0
+        self.on_result = None  # Необязательный обработчик (index, analysis) для каждого кадра
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return STOP
+
+    def car_region(self, frame):
+        h, w = frame.shape[:2]
+        if (w, h) not in self.regions:
+            self.regions[(w, h)] = self.stop_line.region(w, h, self.car_margin)
+        return self.regions[(w, h)]
+
+    def lights_needed(self, index, frame):
+        """
+        Нужно ли на этом кадре искать светофоры моделью. Решает стадия детекции,
+        чтобы не тратить проход по плиткам или по кадру, когда трекеру светофоров
+        хватит сохранённых рамок: раз в refresh_interval кадров или при заметном
+        изменении яркости светофоров. Вызывается один раз на кадр.
+
+        Стадия детекции опережает трекер на длину очереди, поэтому изменение
+        яркости проверяется, только когда трекер уже обработал предыдущий поиск:
+        иначе одно изменение запускало бы поиск на каждом кадре в очереди.
+        """
+        tracker = self.light_tracker
+        if (tracker is None or self.last_light_index is None
+                or index - self.last_light_index >= tracker.refresh_interval
+                or (tracker.frame_index > self.last_light_index and tracker.lights_changed(frame))):
+            self.last_light_index = index
+            return True
+        return False
+
+    def decode_stage(self, out_q):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise ValueError(f"Невозможно открыть видео: {self.source}")
+
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+        index = 0
+        try:
+            while True:
+                with METRICS.timer("decode"):
+                    ok, frame = cap.read()
+                if not ok:
+                    break
+                if not self._put(out_q, (index, frame)):
+                    break
+                index += 1
+        finally:
+            cap.release()
+
+    def infer_stage(self, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is STOP:
+                break
+
+            index, frame = item
+            # Светофоры берутся из калибровки, из плиток или из прохода модели по всему кадру
+            lights_from_model = self.calibration is None and self.tiler is None
+            lights_needed = self.calibration is None and self.lights_needed(index, frame)
+            if self.calibration is not None and self.calibration.needs_validation(index):
+                self.calibration.validate(self.model, frame)
+
+            with METRICS.timer("preprocess"):
+                if self.car_margin is None:
+                    img, scale = self.preprocessor(frame, slot=0)
+                    offset = (0, 0)
+                else:
+                    # Машины ищутся только в полосе вокруг стоп-линии
+                    x1, y1, x2, y2 = self.car_region(frame)
+                    img, scale = self.preprocessor(frame[y1:y2, x1:x2], slot=1)
+                    offset = (x1, y1)
+
+            # Светофоры берутся из того же прохода, только если модель видит весь кадр
+            lights_in_pass = lights_from_model and lights_needed and self.car_margin is None
+            classes = [CAR_CLASS, TRAFFIC_LIGHT_CLASS] if lights_in_pass else [CAR_CLASS]
+            with METRICS.timer("inference"):
+                results = self.model(img, classes=classes, verbose=False)
+
+            car_boxes, traffic_light_boxes = split_detections(results[0], scale)
+            car_boxes = shift_boxes(car_boxes, *offset)
+            if self.calibration is None and self.tiler is not None:
+                traffic_light_boxes = None
+                if lights_needed:
+                    with METRICS.timer("tiles"):
+                        traffic_light_boxes = self.tiler.detect_traffic_lights(self.model, frame)
+            elif lights_from_model and not lights_needed:
+                traffic_light_boxes = None  # Трекер светофоров обойдётся сохранёнными рамками
+            elif lights_from_model and self.car_margin is not None:
+                # Светофорам нужен весь кадр: отдельный проход, только когда трекер просит свежие рамки
+                with METRICS.timer("preprocess"):
+                    img, scale = self.preprocessor(frame, slot=0)
+                with METRICS.timer("inference"):
+                    results = self.model(img, classes=[TRAFFIC_LIGHT_CLASS], verbose=False)
+                traffic_light_boxes = split_detections(results[0], scale)[1]
+            if not self._put(out_q, (index, frame, car_boxes, traffic_light_boxes)):
+                break
+
+    def pool_stage(self, in_q, out_q):
+        """
+        Вариант infer_stage для InferencePool: кадры детектируются параллельно
+        в процессах пула, а дальше передаются строго в порядке кадров.
+        """
+        pending = deque()  # (index, frame, lights_needed, future) в порядке кадров
+
+        def put_oldest():
+            index, frame, lights_needed, future = pending.popleft()
+            with METRICS.timer("pool_wait"):
+                (car_boxes, traffic_light_boxes), _ = future.result()
+            if not lights_needed:
+                traffic_light_boxes = None
+            return self._put(out_q, (index, frame, car_boxes, traffic_light_boxes))
+
+        while True:
+            item = self._get(in_q)
+            if item is STOP:
+                break
+
+            index, frame = item
+            if self.calibration is not None and self.calibration.needs_validation(index):
+                self.calibration.validate(self.model, frame)
+
+            lights_needed = self.calibration is None and self.lights_needed(index, frame)
+            pending.append((index, frame, lights_needed, self.pool.submit(frame)))
+            if len(pending) >= self.pool.max_pending and not put_oldest():
+                return
+
+        while pending:
+            if not put_oldest():
+                return
+
+    def postprocess_stage(self, in_q, out_q):
+        while True:
+            item = self._get(in_q)
+            if item is STOP:
+                break
+
+            index, frame, car_boxes, traffic_light_boxes = item
+            with METRICS.timer("classify"):
+                traffic_light_states = None
+                if self.calibration is not None:
+                    lights = self.calibration.classify(frame)
+                    traffic_light_boxes = [light['box'] for light in lights]
+                    traffic_light_states = [light['state'] for light in lights]
+                elif self.light_tracker is not None:
+                    # None — светофоры на этом кадре не искали (см. lights_needed),
+                    # используются сохранённые рамки и состояния
+                    lights = self.light_tracker.update(frame, traffic_light_boxes)
+                    traffic_light_boxes = [light['box'] for light in lights]
+                    traffic_light_states = [light['state'] for light in lights]
+
+            with METRICS.timer("postprocess"):
+                if self.camera_config is not None:
+                    analysis = self.camera_config.analyze(frame, car_boxes, traffic_light_boxes,
+                                                          traffic_light_states)
+                else:
+                    analysis = analyze_frame(frame, car_boxes, traffic_light_boxes, self.stop_line_points,
+                                             traffic_light_states)
+                if self.vehicle_tracker is not None and self.camera_config is not None:
+                    self.track_approaches(analysis)
+                elif self.vehicle_tracker is not None:
+                    # Нарушение считается один раз — в момент пересечения линии треком
+                    track_ids, events = self.vehicle_tracker.update(car_boxes, analysis['traffic_light_state'])
+                    for car, track_id in zip(analysis['cars'], track_ids):
+                        car['track_id'] = track_id
+                        car['violation'] = self.vehicle_tracker.tracks[track_id].violation
+                    analysis['crossings'] = events
+                    analysis['violations'] = sum(event['violation'] for event in events)
+            count_frame(analysis)
+
+            if not self._put(out_q, (index, frame, analysis)):
+                break
+
+    def track_approaches(self, analysis):
+        """
+        Отслеживание машин для нескольких направлений: трекер каждого
+        направления получает машины, отнесённые CameraConfig к его линии,
+        и состояние светофора этого направления.
+        """
+        events = []
+        for tracker, approach in zip(self.vehicle_tracker, analysis['approaches']):
+            cars = [car for car in analysis['cars'] if car['approach'] == approach['name']]
+            track_ids, approach_events = tracker.update([car['box'] for car in cars], approach['traffic_light_state'])
+            for car, track_id in zip(cars, track_ids):
+                car['track_id'] = track_id
+                car['violation'] = tracker.tracks[track_id].violation
+            for event in approach_events:
+                event['approach'] = approach['name']
+            approach['violations'] = sum(event['violation'] for event in approach_events)
+            events.extend(approach_events)
+        analysis['crossings'] = events
+        analysis['violations'] = sum(event['violation'] for event in events)
+
+    def render_stage(self, in_q):
+        writer = None
+        try:
+            while True:
+                item = self._get(in_q)
+                if item is STOP:
+                    break
+
+                index, frame, analysis = item
+                self.frames += 1
+                self.violations += analysis['violations']
+                if self.on_result is not None:
+                    self.on_result(index, analysis)
+
+                if self.output_path is None:
+                    continue
+
+                with METRICS.timer("render"):
+                    annotate_frame(frame, analysis, self.stop_line_points)
+                    if writer is None:
+                        h, w = frame.shape[:2]
+                        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+                        writer = cv2.VideoWriter(self.output_path, fourcc, self.fps, (w, h))
+                    writer.write(frame)
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def _run_stage(self, stage, in_q, out_q):
+        try:
+            if in_q is None:
+                stage(out_q)
+            elif out_q is None:
+                stage(in_q)
+            else:
+                stage(in_q, out_q)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if out_q is not None:
+                self._put(out_q, STOP)
+
+    def _sample_queues(self, interval):
+        while not self.stop_event.wait(interval):
+            for name, q in self.queues.items():
+                self.queue_samples[name].append(q.qsize())
+
+    def run(self, sample_interval=0.05):
+        """
+        Запускает все стадии и ждёт окончания видео.
+
+        Returns:
+            dict: Кадры, время, устойчивый FPS, нарушения и глубина очередей (средняя и максимальная)
+        """
+        q = self.queues
+        stages = [
+            (self.decode_stage, None, q['decode']),
+            (self.infer_stage if self.pool is None else self.pool_stage, q['decode'], q['infer']),
+            (self.postprocess_stage, q['infer'], q['postprocess']),
+            (self.render_stage, q['postprocess'], None)
+        ]
+        threads = [threading.Thread(target=self._run_stage, args=stage, daemon=True) for stage in stages]
+        sampler = threading.Thread(target=self._sample_queues, args=(sample_interval,), daemon=True)
+
+        start_time = time.time()
+        sampler.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed_time = time.time() - start_time
+        self.stop_event.set()
+        sampler.join()
+
+        if self.error is not None:
+            raise self.error
+
+        queue_depth = {}
+        for name, samples in self.queue_samples.items():
+            queue_depth[name] = {
+                'mean': sum(samples) / len(samples) if samples else 0.0,
+                'max': max(samples) if samples else 0
+            }
+
+        return {
+            'frames': self.frames,
+            'elapsed': elapsed_time,
+            'fps': self.frames / elapsed_time if elapsed_time > 0 else 0.0,
+            'violations': self.violations,
+            'queue_depth': queue_depth
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка нарушений стоп-линии на видео")
+    parser.add_argument("source", help="Видеофайл, URL потока или номер камеры")
+    lines = parser.add_mutually_exclusive_group(required=True)
+    lines.add_argument("--stop-line", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                       help="Две точки стоп-линии")
+    lines.add_argument("--camera-config",
+                       help="Файл настройки камеры с несколькими стоп-линиями (.json)")
+    parser.add_argument("--model", default="yolo11n.pt", help="Веса модели")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch",
+                        help="Бэкенд инференса (onnx, openvino и int8 готовятся один раз рядом с .pt)")
+    parser.add_argument("--output", help="Файл для видео с разметкой (.mp4)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Размер очереди между стадиями")
+    parser.add_argument("--kernel-size", type=int, default=3, help="Размер ядра фильтра шума")
+    parser.add_argument("--denoise", choices=DENOISE_FILTERS, default=DEFAULT_DENOISE, help="Фильтр шума")
+    parser.add_argument("--target-size", type=int, default=DEFAULT_TARGET_SIZE,
+                        help="Уменьшать кадр до этой длинной стороны перед фильтром (по умолчанию не уменьшать)")
+    parser.add_argument("--light-refresh", type=int, default=15,
+                        help="Обновлять светофоры раз в N кадров (0 — на каждом кадре без трекера)")
+    parser.add_argument("--no-track", action="store_true",
+                        help="Не отслеживать машины (нарушение считается на каждом кадре)")
+    parser.add_argument("--camera-id", help="Неподвижная камера: светофоры берутся из её калибровки")
+    parser.add_argument("--validate-interval", type=int, default=900,
+                        help="Проверять калибровку моделью раз в N кадров")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Искать светофоры по плиткам в полном разрешении (с --camera-id — только при калибровке)")
+    parser.add_argument("--tile-size", type=int, default=640, help="Сторона плитки")
+    parser.add_argument("--light-roi", type=int, nargs=4, metavar=("X1", "Y1", "X2", "Y2"),
+                        help="Область светофоров, плитки покрывают только её")
+    parser.add_argument("--car-roi-margin", type=int,
+                        help="Искать машины только в полосе такой ширины вокруг стоп-линии (пиксели); "
+                             "светофоры по всему кадру ищутся только при обновлении трекера")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Процессов детекции с собственной моделью (0 — детекция в потоке конвейера)")
+    parser.add_argument("--threads", type=int, default=1, help="Потоков torch и OpenCV на процесс детекции")
+    parser.add_argument("--metrics", help="Файл для метрик стадий (.json или .prom)")
+    args = parser.parse_args()
+    if args.car_roi_margin is not None and not args.camera_id and args.light_refresh <= 0:
+        parser.error("--car-roi-margin нужна вместе с --camera-id или трекером светофоров (--light-refresh > 0)")
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    if args.camera_config:
+        stop_line_points = CameraConfig.from_file(args.camera_config)
+    else:
+        x1, y1, x2, y2 = args.stop_line
+        stop_line_points = [(x1, y1), (x2, y2)]
+
+    # С пулом модель в основном процессе нужна только для проверки калибровки
+    model = load_model(args.model, args.backend) if args.workers == 0 or args.camera_id else None
+    light_tracker = TrafficLightTracker(refresh_interval=args.light_refresh) if args.light_refresh > 0 else None
+
+    tiler = TiledDetector(args.tile_size, roi=args.light_roi) if args.tiles else None
+
+    calibration = None
+    if args.camera_id:
+        # Без сохранённой калибровки рамки будут найдены на первом кадре
+        calibration = (TrafficLightCalibration.load(args.camera_id, validate_interval=args.validate_interval,
+                                                    tiler=tiler)
+                       or TrafficLightCalibration(args.camera_id, validate_interval=args.validate_interval,
+                                                  tiler=tiler))
+
+    # Трекер пересечений знает только одну линию, поэтому у каждого направления свой
+    vehicle_tracker = None
+    if not args.no_track and args.camera_config:
+        vehicle_tracker = [VehicleTracker(approach.stop_line) for approach in stop_line_points.approaches]
+    elif not args.no_track:
+        vehicle_tracker = VehicleTracker(StopLine.from_points(stop_line_points))
+
+    preprocessor = Preprocessor(args.kernel_size, args.denoise, args.target_size or None)
+    pool = None
+    if args.workers > 0:
+        # Со светофорами из калибровки воркерам нужны только машины
+        classes = [CAR_CLASS] if calibration is not None else [CAR_CLASS, TRAFFIC_LIGHT_CLASS]
+        pool = InferencePool(args.model, args.backend, args.workers, args.threads, args.kernel_size,
+                             args.denoise, args.target_size or None, classes=classes)
+    try:
+        pipeline = VideoPipeline(model, source, stop_line_points, args.output, args.queue_size, args.kernel_size,
+                                 light_tracker, calibration, vehicle_tracker, preprocessor, tiler, args.car_roi_margin,
+                                 pool)
+        stats = pipeline.run()
+    finally:
+        if pool is not None:
+            pool.close()
+
+    print(f"Кадров: {stats['frames']}, время {stats['elapsed']:.3f} секунд, FPS: {stats['fps']:.2f}")
+    print(f"Нарушений: {stats['violations']}")
+    for name, depth in stats['queue_depth'].items():
+        print(f"Очередь {name}: средняя глубина {depth['mean']:.2f}, максимальная {depth['max']}")
+    if args.metrics:
+        METRICS.dump(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
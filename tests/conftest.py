@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули проекта лежат плоско в Function/ и импортируются по имени файла
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Function"))
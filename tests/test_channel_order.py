@@ -0,0 +1,61 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from Detected import split_detections
+from preprocessing import Preprocessor
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE_PATH = os.path.join(REPO_DIR, "Images", "third.jpg")
+WEIGHTS_PATH = os.path.join(REPO_DIR, "Function", "yolo11n.pt")
+
+
+@pytest.fixture(scope="module")
+def bgr():
+    img = cv2.imread(IMAGE_PATH)
+    assert img is not None, IMAGE_PATH
+    return img
+
+
+@pytest.fixture(scope="module")
+def detector():
+    """
+    Модель и параметры вызова. Без весов рядом с интерфейсами (офлайн) берётся
+    та же архитектура со случайными весами и нулевым порогом уверенности:
+    её рамки тоже меняются, если модели подать кадр с переставленными каналами.
+    """
+    ultralytics = pytest.importorskip("ultralytics")
+    if os.path.exists(WEIGHTS_PATH):
+        return ultralytics.YOLO(WEIGHTS_PATH), {}
+
+    import torch
+    torch.manual_seed(0)
+    return ultralytics.YOLO("yolo11n.yaml"), {'conf': 0.0}
+
+
+def test_default_preprocessor_keeps_bgr_order(bgr):
+    prepared, scale = Preprocessor()(bgr)
+    assert scale == 1.0
+    assert prepared is not bgr
+
+    expected = cv2.medianBlur(bgr, 3)
+    np.testing.assert_array_equal(prepared, expected)
+    assert not np.array_equal(prepared, expected[..., ::-1])
+
+
+def test_preprocessed_detections_match_filtered_bgr(bgr, detector):
+    model, kwargs = detector
+
+    prepared, scale = Preprocessor()(bgr)
+    preprocessed = model(prepared, verbose=False, **kwargs)[0]
+    direct = model(cv2.medianBlur(bgr, 3), verbose=False, **kwargs)[0]
+    swapped = model(cv2.medianBlur(bgr, 3)[..., ::-1].copy(), verbose=False, **kwargs)[0]
+
+    assert split_detections(preprocessed, scale) == split_detections(direct)
+    # Все рамки, а не только машины и светофоры: у случайных весов их может не быть
+    assert len(direct.boxes) > 0
+    np.testing.assert_array_equal(preprocessed.boxes.data.cpu().numpy(), direct.boxes.data.cpu().numpy())
+    # Перестановка каналов меняет результат, иначе сравнение выше ничего не проверяет
+    assert not np.array_equal(direct.boxes.data.cpu().numpy(), swapped.boxes.data.cpu().numpy())
@@ -0,0 +1,39 @@
+import os
+
+import cv2
+import pytest
+
+pytest.importorskip("onnxruntime")
+ultralytics = pytest.importorskip("ultralytics")
+
+import onnx
+
+from modelRegistry import exported_path
+from quantization import SCORE_TOLERANCE, quantize_model, score_error
+
+IMAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Images", "third.jpg")
+
+
+@pytest.fixture(scope="module")
+def int8_model(tmp_path_factory):
+    """INT8-модель из архитектуры yolo11n со случайными весами (без загрузки весов из сети)."""
+    import torch
+    torch.manual_seed(0)
+    weights = str(tmp_path_factory.mktemp("weights") / "yolo11n_random.pt")
+    ultralytics.YOLO("yolo11n.yaml").save(weights)
+
+    frame = cv2.imread(IMAGE_PATH)
+    return weights, quantize_model(weights, [frame]), frame
+
+
+def test_detect_output_is_not_quantized(int8_model):
+    _, int8_path, _ = int8_model
+    graph = onnx.load(int8_path).graph
+    producers = {output: node for node in graph.node for output in node.output}
+    # Общая шкала на output0 обнуляла оценки классов
+    assert producers[graph.output[0].name].op_type != "DequantizeLinear"
+
+
+def test_int8_scores_match_fp32(int8_model):
+    weights, int8_path, frame = int8_model
+    assert score_error(exported_path(weights, "onnx"), int8_path, frame) <= SCORE_TOLERANCE
@@ -0,0 +1,29 @@
+import pytest
+
+from cameraConfig import Approach, CameraConfig
+from service import DetectionService
+from stopLine import StopLine
+
+
+@pytest.fixture
+def service(tmp_path):
+    CameraConfig("north", [Approach("север", StopLine.from_points([(0, 500), (800, 500)]))], str(tmp_path)).save()
+    return DetectionService(batcher=None, config_dir=str(tmp_path))
+
+
+def test_camera_loads_config(service):
+    assert service.camera("north").camera_id == "north"
+    assert list(service.cameras) == ["north"]
+
+
+@pytest.mark.parametrize("camera_id", ["", "..", "../north", "sub/north", "/etc/passwd", "..\\north", "a..b"])
+def test_camera_rejects_paths(service, camera_id):
+    with pytest.raises(ValueError, match="Недопустимый"):
+        service.camera(camera_id)
+    assert service.cameras == {}
+
+
+def test_unknown_camera_is_not_cached(service):
+    with pytest.raises(ValueError, match="Нет настройки"):
+        service.camera("south")
+    assert service.cameras == {}
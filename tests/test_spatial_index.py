@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from spatialIndex import LineBandIndex, bottom_centers, segment_distances
+from stopLine import StopLine
+
+
+def random_lines(rng, count):
+    """Наклонные, горизонтальные и вертикальные (в обе стороны) стоп-линии."""
+    lines = []
+    for i in range(count):
+        x, y = (int(v) for v in rng.integers(100, 1500, 2))
+        length = int(rng.integers(50, 400))
+        kind = i % 4
+        if kind == 0:
+            point2 = (x + length, y + int(rng.integers(-100, 100)))
+        elif kind == 1:
+            point2 = (x + length, y)
+        elif kind == 2:
+            point2 = (x, y + length)
+        else:
+            point2 = (x, y - length)
+        lines.append(StopLine((x, y), point2, int(rng.integers(10, 80))))
+    return lines
+
+
+def random_boxes(rng, count, as_float):
+    x1 = rng.uniform(0, 1800, count)
+    y1 = rng.uniform(0, 1600, count)
+    boxes = np.stack([x1, y1, x1 + rng.uniform(5, 300, count), y1 + rng.uniform(5, 200, count)], axis=1)
+    return boxes if as_float else boxes.astype(int)
+
+
+@pytest.mark.parametrize("as_float", [False, True])
+@pytest.mark.parametrize("count", [0, 1, 10, 300])
+def test_index_matches_brute_force(count, as_float):
+    rng = np.random.default_rng([count, int(as_float)])
+    for _ in range(20):
+        lines = random_lines(rng, 8)
+        boxes = random_boxes(rng, count, as_float)
+        index = LineBandIndex(lines)
+        overlaps = index.overlaps(boxes)
+
+        for line, column, found in zip(lines, overlaps.T, index.intersecting(boxes)):
+            expected = np.flatnonzero(line.intersects_boxes(boxes.astype(np.float64)) & column)
+            np.testing.assert_array_equal(found, expected)
+
+        distance = segment_distances(bottom_centers(boxes.astype(np.float64))[:, None],
+                                     index.starts[None], index.vectors[None])
+        expected = [int(np.flatnonzero(row)[np.argmin(d[row])]) if row.any() else -1
+                    for row, d in zip(overlaps, distance)]
+        np.testing.assert_array_equal(index.nearest(boxes), expected)
@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+from Detected import (VECTORIZE_MIN_BOXES, check_car_over_stop_line, check_cars_over_stop_line_array,
+                      line_intersects_box, point_below_line)
+from stopLine import StopLine
+
+
+# Исходный скалярный алгоритм проверки стоп-линии (до векторизации), эталон для сравнения
+
+def reference_point_below_line(point, line_point1, line_point2):
+    px, py = point
+    x1, y1 = line_point1
+    x2, y2 = line_point2
+    if x1 == x2:
+        return px > x1 if y2 > y1 else px < x1
+    k = (y2 - y1) / (x2 - x1)
+    b = y1 - k * x1
+    return py > k * px + b
+
+
+def reference_line_intersects_box(line_point1, line_point2, box):
+    x1, y1, x2, y2 = box
+    lx1, ly1 = line_point1
+    lx2, ly2 = line_point2
+
+    corners = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+    sides = [reference_point_below_line(corner, line_point1, line_point2) for corner in corners]
+    if len(set(sides)) > 1:
+        return True
+    if lx2 == lx1:
+        return False
+
+    k = (ly2 - ly1) / (lx2 - lx1)
+    b = ly1 - k * lx1
+    for edge_x in (x1, x2):
+        if min(lx1, lx2) <= edge_x <= max(lx1, lx2):
+            line_y = k * edge_x + b
+            if y1 <= line_y <= y2 or y2 <= line_y <= y1:
+                return True
+    for edge_y in (y1, y2):
+        if min(ly1, ly2) <= edge_y <= max(ly1, ly2) and k != 0:
+            line_x = (edge_y - b) / k
+            if x1 <= line_x <= x2:
+                return True
+    return False
+
+
+def reference_check_car(box, stop_line_points, threshold=50):
+    line_point1, line_point2 = stop_line_points
+    x1, y1, x2, y2 = box
+    intersects = reference_line_intersects_box(line_point1, line_point2, box)
+
+    px, py = (x1 + x2) // 2, y2
+    bottom_below = reference_point_below_line((px, py), line_point1, line_point2)
+
+    lx1, ly1 = line_point1
+    lx2, ly2 = line_point2
+    if lx2 == lx1:
+        distance = abs(px - lx1)
+    else:
+        A = ly2 - ly1
+        B = -(lx2 - lx1)
+        C = (lx2 - lx1) * ly1 - (ly2 - ly1) * lx1
+        distance = abs(A * px + B * py + C) / ((A**2 + B**2)**0.5)
+
+    is_over = False
+    if intersects:
+        is_over = True
+        distance = -distance if bottom_below else distance
+    elif bottom_below and distance <= threshold:
+        is_over = True
+        distance = -distance
+    return is_over, distance
+
+
+def random_boxes(rng, count, as_float):
+    x1 = rng.uniform(0, 1800, count)
+    y1 = rng.uniform(0, 1000, count)
+    boxes = np.stack([x1, y1, x1 + rng.uniform(5, 300, count), y1 + rng.uniform(5, 200, count)], axis=1)
+    return boxes if as_float else boxes.astype(int)
+
+
+def random_line(rng, kind):
+    x1, y1 = (int(v) for v in rng.integers(0, 1500, 2))
+    if kind == "horizontal":
+        return [(x1, y1), (x1 + int(rng.integers(50, 400)), y1)]
+    if kind == "vertical_down":
+        return [(x1, y1), (x1, y1 + int(rng.integers(50, 400)))]
+    if kind == "vertical_up":
+        return [(x1, y1 + int(rng.integers(50, 400))), (x1, y1)]
+    return [(x1, y1), (int(rng.integers(0, 1500)), int(rng.integers(0, 1500)))]
+
+
+@pytest.mark.parametrize("kind", ["sloped", "horizontal", "vertical_down", "vertical_up"])
+@pytest.mark.parametrize("as_float", [False, True])
+def test_vectorized_matches_scalar_algorithm(kind, as_float):
+    rng = np.random.default_rng([sum(map(ord, kind)), int(as_float)])
+    for _ in range(50):
+        stop_line_points = random_line(rng, kind)
+        if stop_line_points[0] == stop_line_points[1]:
+            continue
+        boxes = random_boxes(rng, 40, as_float)
+
+        expected = [reference_check_car(tuple(box), stop_line_points) for box in boxes.tolist()]
+        expected_over = np.array([is_over for is_over, _ in expected])
+        expected_distance = np.array([distance for _, distance in expected], dtype=np.float64)
+
+        is_over, distance = check_cars_over_stop_line_array(boxes, stop_line_points)
+        np.testing.assert_array_equal(is_over, expected_over)
+        np.testing.assert_allclose(distance, expected_distance, rtol=1e-9, atol=1e-9)
+
+        is_over, distance = StopLine.from_points(stop_line_points).evaluate_boxes(boxes)
+        np.testing.assert_array_equal(is_over, expected_over)
+        np.testing.assert_allclose(distance, expected_distance, rtol=1e-9, atol=1e-9)
+
+
+def test_empty_boxes():
+    is_over, distance = check_cars_over_stop_line_array(np.zeros((0, 4)), [(0, 0), (100, 10)])
+    assert is_over.shape == (0,) and distance.shape == (0,)
+
+
+@pytest.mark.parametrize("kind", ["sloped", "horizontal", "vertical_down", "vertical_up"])
+@pytest.mark.parametrize("count", [1, 5, VECTORIZE_MIN_BOXES + 10])
+def test_scalar_path_matches_scalar_algorithm(kind, count):
+    rng = np.random.default_rng([sum(map(ord, kind)), count])
+    for _ in range(50):
+        stop_line_points = random_line(rng, kind)
+        if stop_line_points[0] == stop_line_points[1]:
+            continue
+        boxes = [tuple(box) for box in random_boxes(rng, count, False).tolist()]
+        stop_line = StopLine.from_points(stop_line_points)
+
+        cars = check_car_over_stop_line(boxes, stop_line_points)
+        for box, car in zip(boxes, cars):
+            is_over, distance = reference_check_car(box, stop_line_points)
+            assert car['is_over'] == is_over
+            assert car['distance'] == pytest.approx(distance)
+            assert stop_line.intersects_box(box) == reference_line_intersects_box(*stop_line_points, box)
+            assert line_intersects_box(*stop_line_points, box) == reference_line_intersects_box(*stop_line_points, box)
+
+            point = ((box[0] + box[2]) // 2, box[3])
+            assert point_below_line(point, *stop_line_points) == reference_point_below_line(point, *stop_line_points)